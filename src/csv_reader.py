@@ -0,0 +1,85 @@
+from typing import Iterator
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:  # pyarrow is only pulled in through pymrio
+    pa = None
+    pa_csv = None
+
+# rows parsed at once by the pandas engine
+CHUNK_ROWS = 1024
+# bytes parsed at once by the pyarrow engine
+BLOCK_SIZE = 1 << 26
+
+
+def _pyarrow_chunks(
+    datapath: str, n_columns: int, dtype: np.dtype
+) -> Iterator[np.ndarray]:
+    names = [f"c{i}" for i in range(n_columns)]
+    reader = pa_csv.open_csv(
+        datapath,
+        read_options=pa_csv.ReadOptions(column_names=names, block_size=BLOCK_SIZE),
+        convert_options=pa_csv.ConvertOptions(
+            column_types={name: pa.from_numpy_dtype(dtype) for name in names}
+        ),
+    )
+    for batch in reader:
+        chunk = np.empty((batch.num_rows, n_columns), dtype=dtype)
+        for i, column in enumerate(batch.columns):
+            chunk[:, i] = column.to_numpy(zero_copy_only=False)
+        yield chunk
+
+
+def _pandas_chunks(
+    datapath: str, n_columns: int, dtype: np.dtype
+) -> Iterator[np.ndarray]:
+    reader = pd.read_csv(
+        datapath,
+        header=None,
+        names=range(n_columns),
+        dtype=dtype,
+        engine="c",
+        chunksize=CHUNK_ROWS,
+    )
+    for chunk in reader:
+        yield chunk.to_numpy(dtype=dtype)
+
+
+def read_chunks(
+    datapath: str, n_columns: int, dtype: np.dtype = np.float64
+) -> Iterator[np.ndarray]:
+    """Streams a headerless numeric csv as blocks of rows
+
+    Uses the pyarrow streaming reader if pyarrow is installed, the pandas C engine otherwise.
+
+    Args:
+        datapath (str): The csv file
+        n_columns (int): The number of columns
+        dtype (np.dtype): The dtype of the blocks
+    """
+    dtype = np.dtype(dtype)
+    if pa_csv is not None:
+        return _pyarrow_chunks(datapath, n_columns, dtype)
+    return _pandas_chunks(datapath, n_columns, dtype)
+
+
+def read_matrix(
+    datapath: str, shape: tuple[int, int], dtype: np.dtype = np.float64
+) -> np.ndarray:
+    """Reads a headerless numeric csv into a preallocated array
+
+    The csv is streamed in row blocks, so the peak memory stays close to the size of the result.
+    """
+    values = np.empty(shape, dtype=dtype)
+    start = 0
+    for chunk in read_chunks(datapath, shape[1], dtype):
+        if start + len(chunk) > shape[0]:
+            raise ValueError(f"{datapath} has more than the expected {shape[0]} rows")
+        values[start : start + len(chunk)] = chunk
+        start += len(chunk)
+    if start != shape[0]:
+        raise ValueError(f"{datapath} has {start} rows, expected {shape[0]}")
+    return values
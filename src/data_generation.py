@@ -6,16 +6,22 @@ import json
 import time
 
 from src.share_functions import (
-    ptt,
-    co2_shares,
+    ptt_matrix,
+    co2_share_variants,
     embodied_value_added,
     embodied_co2_emissions,
     dependency_shares,
     co2_shares_sectoral,
     co2_total,
+    calc_lean,
 )
+from src.result_cache import ResultCache
 
-eora = pymrio.parse_eora26(year=2017, path="data/" + str(2017)).calc_all()
+# results are cached on disk, the Eora is only parsed if one of them is missing
+results = ResultCache(
+    "data/" + str(2017),
+    load=lambda: calc_lean(pymrio.parse_eora26(year=2017, path="data/" + str(2017))),
+)
 # Create output directories if they don't exist
 output_dir = "results"
 plot_dir = "results/plots"
@@ -24,98 +30,87 @@ os.makedirs(plot_dir, exist_ok=True)
 
 
 with open("data/north_codes.json") as f:
-    north_codes = list(set(json.load(f)))
+    north_codes = sorted(set(json.load(f)))
 
 with open("data/south_codes.json") as f:
-    south_codes = list(set(json.load(f)))
+    south_codes = sorted(set(json.load(f)))
 
 with open("data/eu_codes.json") as f:
-    eu_codes = list(set(json.load(f)))
+    eu_codes = sorted(set(json.load(f)))
 
 # removes Guinnea-Bissau
 with open("data/Low_income.json") as f:
-    low_income_codes = list(set(json.load(f)))
+    low_income_codes = sorted(set(json.load(f)))
 
 # removed 'FSM' 'TLS' 'COM' 'KIR' 'SLB'
 with open("data/Lower_middle_income.json") as f:
-    lower_middle_income_codes = list(set(json.load(f)))
+    lower_middle_income_codes = sorted(set(json.load(f)))
 
 # removes 'TON' 'XKX' 'DMA' 'LCA' 'MHL' 'GNQ' 'GRD' 'VCT' 'TUV'
 with open("data/Upper_middle_income.json") as f:
-    upper_middle_income_codes = list(set(json.load(f)))
+    upper_middle_income_codes = sorted(set(json.load(f)))
 
 # removed 'MAF' 'IMN' 'SXM' 'CHI' 'NRU' 'MNP' 'GIB' 'FRO' 'KNA' 'PRI' 'TCA' 'CUW' 'ASM' 'GUM' 'VIR' 'PLW'
 with open("data/High_income.json") as f:
-    high_income_codes = list(set(json.load(f)))
+    high_income_codes = sorted(set(json.load(f)))
 
 
 def generate_data(from_codes, to_codes, to_code_name):
     non_from_to = [el for el in to_codes if el not in from_codes]
-    non_from_to_wo_russia = [el for el in non_from_to if el != "RUS"]
-    non_from_to_wo_china = [el for el in non_from_to if el != "CHN"]
-    non_from_to_wo_india = [el for el in non_from_to if el != "IND"]
-
-    total_co2 = co2_total(eora, from_codes, to_codes)
-    total_co2.name = "Share of Indicrect CO2 produced in the " + to_code_name
-    total_co2_wo_russia = co2_total(eora, from_codes, non_from_to_wo_russia)
-    total_co2_wo_russia.name = (
-        "Share of Indicrect CO2 produced in the global south without russia"
-    )
-    total_co2_wo_china = co2_total(eora, from_codes, non_from_to_wo_china)
-    total_co2_wo_china.name = (
-        "Share of Indicrect CO2 produced in the global south without china"
-    )
-
-    total_co2_wo_india = co2_total(eora, from_codes, non_from_to_wo_india)
-    total_co2_wo_india.name = (
-        "Share of Indicrect CO2 produced in the global south without india"
-    )
 
-    merged_co2 = pd.DataFrame(
-        {
-            "With Russia": total_co2,
-            "Without Russia": total_co2_wo_russia,
-            "Without China": total_co2_wo_china,
-            "Without India": total_co2_wo_india,
-        }
+    # "With Russia" covers all of to_codes, the other variants only the non_from_to
+    merged_co2 = results(
+        co2_total,
+        from_codes,
+        to_codes,
+        exclusions={
+            "With Russia": [],
+            "Without Russia": from_codes + ["RUS"],
+            "Without China": from_codes + ["CHN"],
+            "Without India": from_codes + ["IND"],
+        },
     )
     merged_co2.to_csv(output_dir + "/share_produced_by" + to_code_name + ".csv")
 
-    ptts = pd.Series(
-        [ptt(eora, from_codes, el) for el in non_from_to],
-        index=non_from_to,
-        name="PTT_Ratio",
+    ptts = (
+        results(ptt_matrix, from_codes, non_from_to)
+        .loc["from"]
+        .rename("PTT_Ratio")
+        .rename_axis(None)
     )
     ptts.to_csv(output_dir + "/ptts_" + to_code_name + ".csv")
-    dependency_shares(eora, from_codes, non_from_to).to_csv(
+    results(dependency_shares, from_codes, non_from_to).to_csv(
         output_dir + "/dependency_shares_" + to_code_name + ".csv"
     )
 
-    all_co2_shares = co2_shares(eora, from_codes, non_from_to).sum()
-    all_co2_shares_wo_russia = co2_shares(eora, from_codes, non_from_to_wo_russia).sum()
-    all_co2_shares_wo_china = co2_shares(eora, from_codes, non_from_to_wo_china).sum()
-    all_co2_shares_wo_india = co2_shares(eora, from_codes, non_from_to_wo_india).sum()
-
-    all_co2_shares.name = "CO2 shares"
-    all_co2_shares_wo_russia.name = "CO2 shares without russia"
-    all_co2_shares_wo_china.name = "CO2 shares without china"
-    all_co2_shares_wo_india.name = "CO2 shares without india"
+    all_co2_shares = results(
+        co2_share_variants,
+        from_codes,
+        non_from_to,
+        exclusions={
+            "CO2 shares": [],
+            "CO2 shares without russia": ["RUS"],
+            "CO2 shares without china": ["CHN"],
+            "CO2 shares without india": ["IND"],
+        },
+    )
 
-    all_embodied_co2 = embodied_co2_emissions(eora, from_codes, non_from_to).sum()
+    all_embodied_co2 = results(
+        embodied_co2_emissions, from_codes, non_from_to
+    ).sum()
     all_embodied_co2.name = "Embodied CO2"
-    all_embodied_value_added = embodied_value_added(eora, from_codes, non_from_to)
+    all_embodied_value_added = results(
+        embodied_value_added, from_codes, non_from_to
+    )
     all_embodied_value_added.name = "Embodied value added"
 
     # All sectoral CO2 shares
-    all_sectoral_shares = co2_shares_sectoral(eora, from_codes, non_from_to)
+    all_sectoral_shares = results(co2_shares_sectoral, from_codes, non_from_to)
     all_sectoral_shares.name = "Sectoral CO2 share"
 
     res = pd.concat(
         [
             all_co2_shares,
-            all_co2_shares_wo_russia,
-            all_co2_shares_wo_china,
-            all_co2_shares_wo_india,
             all_sectoral_shares,
             all_embodied_co2,
             all_embodied_value_added,
@@ -1,17 +1,36 @@
 import os
+import copy
+import functools
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 from src.extension import Extension
+from src import eora_cache, csv_reader
+from src.leontief import LeontiefSolver, BorderedSolver, ExplicitInverseSolver
+from src.sparse_frame import SparseFrame
+from src.index_codes import IndexCodes, as_slice
 import numpy as np
-from numpy.linalg import inv
-from typing import Iterable, Any
+import scipy.sparse as sp
+from typing import Iterable, Any, Callable
 from dataclasses import dataclass
 
 
 @dataclass
 class SectorData:
+    """The accounts of a sector created by `Eora.dissaggregate`
+
+    Attributes:
+        t_rows (pd.Series): Its row of T (sales), indexed by the sectors after disaggregation
+        t_columns (pd.Series): Its column of T (purchases), indexed by the sectors after disaggregation
+        x (float): Its total output
+        y (pd.Series): Its row of the final demand, indexed like the columns of y
+        v (pd.Series): Its column of the value added, indexed like the rows of v
+        q (pd.Series): Its column of the satellite accounts, indexed like the rows of q.f
+    """
+
     t_rows: pd.Series
     t_columns: pd.Series
-    x: pd.Series
+    x: float
     y: pd.Series
     v: pd.Series
     q: pd.Series
@@ -19,124 +38,554 @@ class SectorData:
 
 DisaggregatesInto = Iterable[tuple[Any, SectorData]]
 
+SOURCE_FILES = [
+    "T.csv",
+    "Y.csv",
+    "V.csv",
+    "Q.csv",
+    "index_t.csv",
+    "index_y.csv",
+    "index_v.csv",
+    "index_q.csv",
+]
+
+# the frames read from the csvs, A and L are derived from them
+TABLES = ["y", "t", "v", "q", "q_y"]
+
+# rows of a dense T converted at once into a sparse matrix
+CHUNK_ROWS = 1024
+
+# the levels of the sector and final demand indices
+INDEX_LEVELS = ["CountryA3", "Entity", "Sector"]
+
+# incremental Leontief updates stacked before I - A is factorized from scratch again
+MAX_UPDATE_DEPTH = 8
+# share of removed and appended sectors up to which an update is cheaper than a new factorization,
+# an update costs about 4 n² per changed sector, a factorization 2/3 n³
+MAX_UPDATE_SHARE = 1 / 6
+
+# blocks and sub system factorizations kept by `Eora.block` and `Eora.sub_solver`
+BLOCK_CACHE_SIZE = 16
+
 
 class Eora:
     """Loads in the full eora
 
+    `aggregated` and `dissaggregated` return snapshots that share all unchanged frames, the
+    Leontief factorization and (until it is accessed) the transaction matrix with their parent.
+    Treat the frames of an Eora that has snapshots as read-only.
+
     Attributes:
         y (pd.DataFrame): The final demand vector
         q (pd.DataFrame): The sattelite accounts
-        t (pd.DataFrame): The transaction matrix
+        t (pd.DataFrame | SparseFrame): The transaction matrix, of a snapshot only built when accessed
         v (pd.DataFrame): The value added matrix
-        a (pd.DataFrame): The technical coefficients matrix
-        l (pd.DataFrame): The leontief inverse
+        a (pd.DataFrame | SparseFrame): The technical coefficients matrix, only built when accessed
+        l (pd.DataFrame): The leontief inverse, only materialized when accessed.
+                          Prefer `solve`/`leontief_apply` when only L @ y is needed.
     """
 
     y: pd.DataFrame
     q: Extension
-    t: pd.DataFrame
     v: pd.DataFrame
     x: pd.DataFrame
-    a: pd.DataFrame
-    l: pd.DataFrame
 
-    def __init__(self, path) -> None:
+    _t: pd.DataFrame | SparseFrame | None = None
+    # builds t of a snapshot from its parent's t on first access
+    _pending_t: Callable[[], pd.DataFrame | SparseFrame] | None = None
+    _a: pd.DataFrame | SparseFrame | None = None
+    _sparse: bool = False
+    _l: pd.DataFrame | None = None
+    _solver: LeontiefSolver | BorderedSolver | None = None
+    # the cache directory A and L are read from on first access, None once the tables diverge from it
+    _cache_path: str | None = None
+    # the cache directory A and L are written to when materialized, None once the tables diverge from it
+    _mmap_path: str | None = None
+    _codes: IndexCodes | None = None
+    # LRU cache of `block` and `sub_solver`, maps keys to (source frame, value)
+    _blocks: OrderedDict | None = None
+    # the codes the bundle masks were computed for, with the masks (see `bundle_mask`)
+    _bundle_masks: tuple[IndexCodes, dict] | None = None
+
+    def __init__(
+        self,
+        path,
+        cache: bool = True,
+        mmap: bool = False,
+        sparse: bool = False,
+        dtype: np.dtype = np.float64,
+        lazy: bool = False,
+    ) -> None:
         """
         Initializes the EORA.
 
         Parameters:
             path (str): The relative path where the data is stored.
                         Note that the indices should be left as downloaded, but the data_csvs should be renamed to Y.csv, T.csv, Q.scv, V.csv respectively.
+            cache (bool): Whether to use the binary cache in `path/.eora_cache`.
+                        It is written on the first load and reused as long as the csv files are unchanged.
+            mmap (bool): Whether t, y, v, q, a and l are backed by read-only memory maps of the cache.
+                        Processes loading the same path then share one physical copy of the matrices.
+                        A is added to the cache on the first such load, L when first used (by `l` or `solve`),
+                        so load once and compute L (e.g. through `l`) before starting workers.
+            sparse (bool): Whether t and a are stored as scipy CSR matrices (see `SparseFrame`).
+                        Leontief products are then solved with a sparse LU factorization and L is never needed.
+            dtype (np.dtype): The dtype t, y, v and q are read as. np.float32 halves their memory,
+                        the Leontief factorization is still computed in double precision.
+                        The cache is rewritten when it was written with a different dtype.
+            lazy (bool): Like mmap, but nothing is computed up front: x is read from the cache
+                        (computed and added on the first lazy load), A and L are only built when accessed.
+                        Selections through `select` and `block` then only read the rows they need.
         """
-        self.y = self._read_y(path)
-        self.t = self._read_t(path)
-        self.v = self._read_v(path)
-        self.x = self.t.sum(axis=0) + self.y.sum(axis=1)
-        q, q_y = self._read_q(path)
-        self.q = Extension(q, q_y, self.x)
-        self.a = self.t.divide(self.x, axis=1)
-        self.l = pd.DataFrame(
-            inv(np.eye(self.a.shape[0]) - self.a.values),
-            index=self.a.index,
-            columns=self.a.columns,
+        mmap = mmap or lazy
+        if mmap and not cache:
+            raise ValueError("mmap requires the binary cache")
+        if mmap and sparse:
+            raise ValueError("mmap and sparse can not be combined")
+
+        self._sparse = sparse
+        frames = self._load_frames(path, cache, mmap, sparse, np.dtype(dtype))
+        if sparse and not isinstance(frames["t"], SparseFrame):
+            frames["t"] = SparseFrame.from_dense(frames["t"], CHUNK_ROWS)
+        elif not sparse and isinstance(frames["t"], SparseFrame):
+            frames["t"] = frames["t"].to_dense()
+
+        self.y = frames["y"]
+        self.t = frames["t"]
+        self.v = frames["v"]
+        if lazy and "x" in frames:
+            self.x = frames["x"]["x"].rename(None)
+        else:
+            self.x = self.t.sum(axis=0) + self.y.sum(axis=1)
+            if lazy:
+                eora_cache.append_frames(path, {"x": self.x.to_frame("x")})
+        self.q = Extension(frames["q"], frames["q_y"], self.x)
+
+        if cache and not sparse:
+            self._cache_path = path
+        if mmap:
+            self._mmap_path = path
+        if not lazy:
+            self._ensure_a()
+        self._ensure_codes()
+
+    def _load_frames(
+        self, path: str, cache: bool, mmap: bool, sparse: bool, dtype: np.dtype
+    ) -> dict[str, pd.DataFrame | SparseFrame]:
+        if not cache:
+            return self._read_csvs(path, sparse, dtype)
+
+        # Only the tables (and x) are read, cached A and L are read when first accessed (see `_read_cached`).
+        # A dense T of a sparse Eora is memory mapped, so that it is converted without being read as a whole.
+        frames = eora_cache.read_frames(
+            path, SOURCE_FILES, mmap or sparse, TABLES + ["x"], dtype.name
         )
+        if frames is None:
+            frames = self._read_csvs(path, sparse, dtype)
+            eora_cache.write_frames(path, frames, SOURCE_FILES, dtype.name)
+            if mmap:
+                frames = eora_cache.read_frames(path, SOURCE_FILES, mmap, TABLES)
+        if mmap and isinstance(frames["t"], SparseFrame):
+            # cached by a sparse load, rewritten dense so that it can be shared as a memory map
+            eora_cache.append_frames(path, {"t": frames["t"].to_dense()})
+            frames["t"] = eora_cache.read_frame(path, "t", mmap)
+        return frames
+
+    @property
+    def t(self) -> pd.DataFrame | SparseFrame:
+        self._build_pending_t()
+        return self._t
+
+    def _build_pending_t(self) -> None:
+        if self._pending_t is not None:
+            self._t = self._pending_t()
+            self._pending_t = None
+
+    @t.setter
+    def t(self, t: pd.DataFrame | SparseFrame) -> None:
+        self._t = t
+        self._pending_t = None
+        self._blocks = None
+
+    @property
+    def a(self) -> pd.DataFrame | SparseFrame:
+        self._ensure_a()
+        return self._a
+
+    def _ensure_a(self) -> None:
+        """Builds A unless it exists or is cached, when memory mapped it is added to the cache and mapped"""
+        if self._a is None:
+            a = self._read_cached("a")
+            if a is not None:
+                self._a = a
+                return
+            a = self.t.divide(self.x, axis=1)
+            if self._mmap_path is not None:
+                eora_cache.append_frames(self._mmap_path, {"a": a})
+                a = eora_cache.read_frame(self._mmap_path, "a", mmap=True)
+            self._a = a
+
+    def _read_cached(self, name: str) -> pd.DataFrame | None:
+        """Reads a cached derived frame (A or L), memory mapped if the tables are, None if it is not cached"""
+        if self._cache_path is None or name not in eora_cache.cached_frames(self._cache_path):
+            return None
+        return eora_cache.read_frame(self._cache_path, name, mmap=self._mmap_path is not None)
+
+    @a.setter
+    def a(self, a: pd.DataFrame | SparseFrame) -> None:
+        self._a = a
+        self._blocks = None
+
+    @property
+    def sectors(self) -> pd.Index:
+        """The sectors, i.e. the rows and columns of T, A and L"""
+        return self.x.index
+
+    @property
+    def codes(self) -> IndexCodes:
+        """Integer codes of the sectors, rebuilt when the sectors change"""
+        self._ensure_codes()
+        return self._codes
+
+    def _ensure_codes(self) -> None:
+        if self._codes is None or self._codes.index is not self.sectors:
+            self._codes = IndexCodes(self.sectors)
+
+    def country_positions(self, countries: Iterable[str]) -> np.ndarray:
+        """Returns the positions of all sectors of the countries in T, A and L"""
+        return self.codes.country_positions(countries)
+
+    def sector_positions(self, sectors: Iterable[tuple]) -> np.ndarray:
+        """Returns the positions of the (country, entity, sector) labels in T, A and L"""
+        return self.codes.sector_positions(sectors)
+
+    def select(
+        self, matrix: str, rows: Any = None, columns: Any = None
+    ) -> pd.DataFrame | SparseFrame:
+        """Returns the rows and columns of a matrix selected by label
+
+        Only the selected rows and columns are read from a memory mapped (e.g. lazy) Eora.
+        Like `block`, the result may be a view of the matrix, so treat it as read-only.
 
-    def _read_dataframe(
-        self, datapath: str, col_indices_path: str, row_indices_path: str
-    ) -> pd.DataFrame:
-        t = pd.read_csv(datapath, header=None)
-        col_index_raw = pd.read_csv(
-            col_indices_path, delimiter=",", quotechar='"', skipinitialspace=True
+        Args:
+            matrix (str): "t", "y", "v", "q" (q.f), "q_y" (q.f_y), "a" or "l"
+            rows: None for all rows, a first level label (e.g. a country),
+                  a partial label tuple like for `.loc` (levels may be lists or slice(None)),
+                  or a list of full labels
+            columns: The columns, like rows
+
+        Example:
+            eora.select("t", ("CHL", slice(None), "Mining and Quarrying"), (["DEU", "FRA"],))
+        """
+        if matrix == "q":
+            frame = self.q.f
+        elif matrix == "q_y":
+            frame = self.q.f_y
+        else:
+            frame = getattr(self, matrix)
+        return _take_block(
+            frame,
+            _label_positions(frame.index, rows),
+            _label_positions(frame.columns, columns),
         )
 
-        row_index_raw = pd.read_csv(
-            row_indices_path, delimiter=",", quotechar='"', skipinitialspace=True
+    def block(
+        self,
+        rows: Iterable[str] | str,
+        columns: Iterable[str] | str,
+        matrix: str = "l",
+    ) -> pd.DataFrame | SparseFrame:
+        """Returns the submatrix of t, a or l between the sectors of two country groups
+
+        Dense blocks are views of the full matrix where both country groups are contiguous in the
+        index (e.g. a single country), so treat them as read-only. The last `BLOCK_CACHE_SIZE`
+        blocks are cached, until the matrix they were taken from is replaced.
+
+        Args:
+            rows (Iterable[str] | str): The countries of the rows
+            columns (Iterable[str] | str): The countries of the columns
+            matrix (str): "t", "a" or "l"
+        """
+        rows = _country_group(rows)
+        columns = _country_group(columns)
+        frame = getattr(self, matrix)
+        return self._cached(
+            (matrix, rows, columns),
+            frame,
+            lambda: _take_block(
+                frame, self.country_positions(rows), self.country_positions(columns)
+            ),
         )
 
-        col_index = pd.MultiIndex.from_frame(
-            col_index_raw[["CountryA3", "Entity", "Sector"]]
+    def sub_solver(self, countries: Iterable[str] | str) -> LeontiefSolver:
+        """Returns the LU factorization of I - A_ss, A restricted to the sectors of the countries
+
+        Only the s×s block is factorized, the solver is cached per country group like `block`.
+        """
+        countries = _country_group(countries)
+        return self._cached(
+            ("sub_leontief", countries),
+            self.a,
+            lambda: LeontiefSolver(self.block(countries, countries, "a").values),
         )
 
-        row_index = pd.MultiIndex.from_frame(
-            row_index_raw[["CountryA3", "Entity", "Sector"]]
+    def sub_leontief(self, countries: Iterable[str] | str) -> pd.DataFrame:
+        """Returns the Leontief inverse of the sub system, (I - A_ss)⁻¹
+
+        Unlike the block `l.loc[s, s]` of the global inverse, it leaves out all output induced
+        through sectors outside of the countries (see claudius.typ).
+        """
+        sectors = self.sectors[self.country_positions(_country_group(countries))]
+        return pd.DataFrame(
+            self.sub_solver(countries).inverse(), index=sectors, columns=sectors
         )
-        t.columns = col_index
-        t.index = row_index
-        return t
 
-    def _read_t(self, path: str) -> pd.DataFrame:
-        datapath = os.path.join(path, "T.csv")
-        row_indices_path = os.path.join(path, "index_t.csv")
-        col_indices_path = os.path.join(path, "index_t.csv")
-        return self._read_dataframe(datapath, col_indices_path, row_indices_path)
+    def _cached(self, key: tuple, source: Any, build: Callable[[], Any]) -> Any:
+        """LRU cache for blocks and factorizations derived from `source` (e.g. self.a)
 
-    def _read_v(self, path: str) -> pd.DataFrame:
-        datapath = os.path.join(path, "V.csv")
-        row_indices_path = os.path.join(path, "index_v.csv")
-        col_indices_path = os.path.join(path, "index_t.csv")
-        return self._read_dataframe(datapath, col_indices_path, row_indices_path)
+        Entries are rebuilt once `source` is replaced, at most `BLOCK_CACHE_SIZE` are kept.
+        """
+        if self._blocks is None:
+            self._blocks = OrderedDict()
+        cached = self._blocks.get(key)
+        if cached is not None and cached[0] is source:
+            self._blocks.move_to_end(key)
+            return cached[1]
+
+        value = build()
+        self._blocks[key] = (source, value)
+        self._blocks.move_to_end(key)
+        while len(self._blocks) > BLOCK_CACHE_SIZE:
+            self._blocks.popitem(last=False)
+        return value
+
+    @property
+    def is_sparse(self) -> bool:
+        return self._sparse
+
+    @property
+    def solver(self) -> LeontiefSolver:
+        """The LU factorization of I - A, computed on first use"""
+        if self._solver is None:
+            self._solver = LeontiefSolver(self.a.values)
+        return self._solver
+
+    @property
+    def l(self) -> pd.DataFrame:
+        if self._l is None:
+            self._l = self._read_cached("l")
+        if self._l is None:
+            l = pd.DataFrame(
+                self.solver.inverse(), index=self.sectors, columns=self.sectors
+            )
+            if self._mmap_path is not None:
+                eora_cache.append_frames(self._mmap_path, {"l": l})
+                l = eora_cache.read_frame(self._mmap_path, "l", mmap=True)
+            self._l = l
+        return self._l
+
+    @l.setter
+    def l(self, l: pd.DataFrame) -> None:
+        self._l = l
+        self._blocks = None
+
+    def solve(self, y: np.ndarray) -> np.ndarray:
+        """Returns L @ y for a demand vector (n,) or a block of demand vectors (n, k)
+
+        Uses L if it is already materialized, otherwise the LU factorization.
+        When memory mapped L is materialized on first use, so that it is cached and shared by all processes.
+        """
+        if self._l is not None or self._mmap_path is not None:
+            return self.l.values @ y
+        return self.solver.solve(y)
 
-    def _read_y(self, path: str) -> pd.DataFrame:
-        datapath = os.path.join(path, "Y.csv")
-        row_indices_path = os.path.join(path, "index_t.csv")
-        col_indices_path = os.path.join(path, "index_y.csv")
-        return self._read_dataframe(datapath, col_indices_path, row_indices_path)
+    def leontief_apply(self, y: pd.Series | pd.DataFrame) -> pd.Series | pd.DataFrame:
+        """Labelled version of `solve`, y is aligned to the sectors of A before solving
 
-    def _read_q(self, path: str) -> tuple[pd.DataFrame, pd.DataFrame]:
-        datapath = os.path.join(path, "Q.csv")
-        row_indices_path = os.path.join(path, "index_q.csv")
-        col_indices_path_t = os.path.join(path, "index_t.csv")
-        col_indices_path_y = os.path.join(path, "index_y.csv")
-        col_index_raw_t = pd.read_csv(
-            col_indices_path_t, delimiter=",", quotechar='"', skipinitialspace=True
-        )
-        col_index_raw_y = pd.read_csv(
-            col_indices_path_y, delimiter=",", quotechar='"', skipinitialspace=True
-        )
+        Args:
+            y (pd.Series | pd.DataFrame): A demand vector or one demand vector per column
 
-        col_index_raw = pd.concat([col_index_raw_t, col_index_raw_y])
-        row_index_raw = pd.read_csv(
-            row_indices_path, delimiter=",", quotechar='"', skipinitialspace=True
-        )
+        Returns:
+            pd.Series | pd.DataFrame: The induced output L @ y, indexed by sector
+        """
+        y = y.reindex(self.sectors, fill_value=0)
+        res = self.solve(y.to_numpy())
+        if isinstance(y, pd.Series):
+            return pd.Series(res, index=self.sectors, name=y.name)
+        return pd.DataFrame(res, index=self.sectors, columns=y.columns)
+
+    def _reset_leontief(self) -> None:
+        """Drops A, L, the factorization and the cached blocks after the tables changed, A is rebuilt on access"""
+        self._a = None
+        self._l = None
+        self._solver = None
+        self._cache_path = None
+        self._mmap_path = None
+        # the blocks hold on to the replaced matrices
+        self._blocks = None
+
+    def _update_leontief(
+        self, n_old: int, kept: np.ndarray, t_columns: np.ndarray, t_rows: np.ndarray
+    ) -> None:
+        """Updates the Leontief solver after sectors were removed and appended
+
+        Expects the kept sectors to come first, in any order, followed by the new sectors.
+        Their block of I - A is unchanged, so the existing factorization (or materialized L)
+        is reused through a `BorderedSolver` instead of factorizing the new table.
+        Only the new rows and columns of T are needed, so T and A do not have to be built.
+        Falls back to `_reset_leontief` if there is nothing to update or too many updates are stacked.
 
-        col_index_y = pd.MultiIndex.from_frame(
-            col_index_raw_y[["CountryA3", "Entity", "Sector"]]
+        Args:
+            n_old (int): The number of sectors before the change
+            kept (np.ndarray): The old positions of the kept sectors, in their new order.
+                        Passed by the caller, as a new sector may reuse the label of a removed one.
+            t_columns (np.ndarray): The columns of the new T for the appended sectors, (n, m)
+            t_rows (np.ndarray): The rows of the new T for the appended sectors, (m, n)
+        """
+        if self._solver is not None:
+            base = self._solver
+        elif self._l is not None:
+            base = ExplicitInverseSolver(self._l.values)
+        else:
+            base = None
+
+        self._reset_leontief()
+        n_new, n_kept = len(self.sectors), len(kept)
+        if base is None or base.depth >= MAX_UPDATE_DEPTH:
+            return
+        n_changed = n_old + n_new - 2 * n_kept
+        if n_changed > MAX_UPDATE_SHARE * n_new:
+            return
+
+        x = self.x.to_numpy(dtype=float)
+        scale = np.divide(1.0, x, out=np.zeros_like(x), where=x != 0)
+        new_columns = t_columns * scale[n_kept:]
+        new_rows = t_rows[:, :n_kept] * scale[:n_kept]
+        i_minus_a = -new_columns
+        i_minus_a[n_kept:] += np.eye(n_new - n_kept)
+        self._solver = BorderedSolver(
+            base,
+            kept,
+            c=i_minus_a[:n_kept],
+            r=-new_rows,
+            d=i_minus_a[n_kept:],
         )
 
-        col_index = pd.MultiIndex.from_frame(
-            col_index_raw[["CountryA3", "Entity", "Sector"]]
+    def _read_csvs(
+        self, path: str, sparse: bool = False, dtype: np.dtype = np.float64
+    ) -> dict[str, pd.DataFrame | SparseFrame]:
+        """Reads the four data files concurrently, the index files are parsed once up front"""
+        indices = self._read_indices(path)
+        # the pyarrow parser releases the GIL, so threads read the files in parallel
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            y = pool.submit(self._read_y, path, indices, dtype)
+            t = pool.submit(self._read_t, path, indices, sparse, dtype)
+            v = pool.submit(self._read_v, path, indices, dtype)
+            q = pool.submit(self._read_q, path, indices, dtype)
+            q, q_y = q.result()
+            return {
+                "y": y.result(),
+                "t": t.result(),
+                "v": v.result(),
+                "q": q,
+                "q_y": q_y,
+            }
+
+    @staticmethod
+    def _read_index(indices_path: str, levels: list[str]) -> pd.MultiIndex:
+        index_raw = pd.read_csv(
+            indices_path, delimiter=",", quotechar='"', skipinitialspace=True
         )
-        row_index = pd.MultiIndex.from_frame(
-            row_index_raw[["IndicatorCode", "LineItems"]]
+        return pd.MultiIndex.from_frame(index_raw[levels])
+
+    def _read_indices(self, path: str) -> dict[str, pd.MultiIndex]:
+        return {
+            "t": self._read_index(os.path.join(path, "index_t.csv"), INDEX_LEVELS),
+            "y": self._read_index(os.path.join(path, "index_y.csv"), INDEX_LEVELS),
+            "v": self._read_index(os.path.join(path, "index_v.csv"), INDEX_LEVELS),
+            "q": self._read_index(
+                os.path.join(path, "index_q.csv"), ["IndicatorCode", "LineItems"]
+            ),
+        }
+
+    def _read_dataframe(
+        self,
+        datapath: str,
+        col_index: pd.MultiIndex,
+        row_index: pd.MultiIndex,
+        sparse: bool = False,
+        dtype: np.dtype = np.float64,
+    ) -> pd.DataFrame | SparseFrame:
+        if sparse:
+            chunks = [
+                sp.csr_array(chunk)
+                for chunk in csv_reader.read_chunks(datapath, len(col_index), dtype)
+            ]
+            return SparseFrame(sp.vstack(chunks, format="csr"), row_index, col_index)
+
+        values = csv_reader.read_matrix(
+            datapath, (len(row_index), len(col_index)), dtype
         )
+        return pd.DataFrame(values, index=row_index, columns=col_index, copy=False)
+
+    def _read_t(
+        self,
+        path: str,
+        indices: dict[str, pd.MultiIndex],
+        sparse: bool = False,
+        dtype: np.dtype = np.float64,
+    ) -> pd.DataFrame | SparseFrame:
+        datapath = os.path.join(path, "T.csv")
+        return self._read_dataframe(datapath, indices["t"], indices["t"], sparse, dtype)
+
+    def _read_v(
+        self, path: str, indices: dict[str, pd.MultiIndex], dtype: np.dtype = np.float64
+    ) -> pd.DataFrame:
+        datapath = os.path.join(path, "V.csv")
+        return self._read_dataframe(datapath, indices["t"], indices["v"], dtype=dtype)
+
+    def _read_y(
+        self, path: str, indices: dict[str, pd.MultiIndex], dtype: np.dtype = np.float64
+    ) -> pd.DataFrame:
+        datapath = os.path.join(path, "Y.csv")
+        return self._read_dataframe(datapath, indices["y"], indices["t"], dtype=dtype)
 
-        q: pd.DataFrame = pd.read_csv(datapath, header=None)
-        q.index = row_index
-        q.columns = col_index
-        q_y = q.loc[:, col_index_y]
-        q_rest = q.drop(col_index_y.to_list())
+    def _read_q(
+        self, path: str, indices: dict[str, pd.MultiIndex], dtype: np.dtype = np.float64
+    ) -> tuple[pd.DataFrame, pd.DataFrame]:
+        datapath = os.path.join(path, "Q.csv")
+        col_index_t, col_index_y, row_index = indices["t"], indices["y"], indices["q"]
+
+        # the columns of Q are the sectors followed by the final demand categories
+        n = len(col_index_t)
+        q = csv_reader.read_matrix(
+            datapath, (len(row_index), n + len(col_index_y)), dtype
+        )
+        q_rest = pd.DataFrame(q[:, :n], index=row_index, columns=col_index_t, copy=False)
+        q_y = pd.DataFrame(q[:, n:], index=row_index, columns=col_index_y, copy=False)
         return q_rest, q_y
 
+    def _derive(self) -> "Eora":
+        """A shallow copy for a snapshot, the frames stay shared until they are replaced"""
+        # build a pending T once here, so that it is shared instead of built by each snapshot
+        self._build_pending_t()
+        snapshot = copy.copy(self)
+        snapshot.q = copy.copy(self.q)
+        snapshot._blocks = None
+        return snapshot
+
+    def aggregated(self, mapping: dict[tuple, tuple]) -> "Eora":
+        """Returns a snapshot with the sectors aggregated, see `aggregate_many`, self is unchanged"""
+        snapshot = self._derive()
+        snapshot.aggregate_many(mapping)
+        return snapshot
+
+    def dissaggregated(self, sector: tuple, aggregates_into: DisaggregatesInto) -> "Eora":
+        """Returns a snapshot with the sector dissaggregated, see `dissaggregate`, self is unchanged"""
+        snapshot = self._derive()
+        snapshot.dissaggregate(sector, aggregates_into)
+        return snapshot
+
     def aggregate(self, sectors: list[tuple], aggregated_sector_name: tuple) -> None:
         """Aggregates sectors together
 
@@ -145,69 +594,278 @@ class Eora:
             aggregated_sector_name (tuple[str]): The name of the new sectors
 
         """
-        self.t[aggregated_sector_name] = self.t[sectors].sum(axis=1)
-        self.t.loc[aggregated_sector_name] = self.t.loc[sectors].sum(axis=0)
-        self.t.drop(sectors, axis=0, inplace=True)
-        self.t.drop(sectors, axis=1, inplace=True)
-
-        self.x[aggregated_sector_name] = self.x[sectors].sum()
-        self.x.drop(sectors, inplace=True)
-
-        self.y.loc[aggregated_sector_name] = self.y.loc[sectors].sum(axis=1)
-        self.y.drop(sectors, inplace=True)
-        self.q[aggregated_sector_name] = self.q[sectors].sum(axis=1)
-        self.q.drop(sectors, axis=1, inplace=True)
-
-        self.a = self.t.divide(self.x, axis=1)
-        self.l = pd.DataFrame(
-            inv(np.eye(self.a.shape[0]) - self.a.values),
-            index=self.a.index,
-            columns=self.a.columns,
-        )
+        self.aggregate_many({sector: aggregated_sector_name for sector in sectors})
 
-    def dissaggregate(self, sector: tuple, aggregates_into: DisaggregatesInto) -> None:
-        """dissaggregates a sector into multiple sectors
+    def aggregate_many(self, mapping: dict[tuple, tuple]) -> None:
+        """Aggregates several groups of sectors at once
+
+        The mapping is applied as one sparse concordance matrix C (groups × sectors), so that
+        T becomes C T Cᵀ, y becomes C y, v and q become v Cᵀ and q Cᵀ, and A and the Leontief
+        solver are recomputed once. Sectors not in the mapping are kept as they are and come first,
+        the groups are appended in the order they first appear.
 
         Args:
-            sector (tuple): The sectors that is deleted
-            aggregates_into (DisaggregatesInto):
+            mapping (dict[tuple, tuple]): Maps each sector that is aggregated to the name of its group
+        """
+        old_sectors = self.sectors
+        is_mapped = old_sectors.isin(list(mapping))
+        if is_mapped.sum() != len(mapping):
+            missing = [sector for sector in mapping if sector not in old_sectors]
+            raise KeyError(f"Sectors not in the table: {missing}")
+
+        groups = list(dict.fromkeys(mapping[sector] for sector in old_sectors[is_mapped]))
+        kept = old_sectors[~is_mapped]
+        if kept.isin(groups).any():
+            raise ValueError("Group names must differ from the sectors that are kept")
+
+        group_positions = {group: len(kept) + i for i, group in enumerate(groups)}
+        new_positions = np.empty(len(old_sectors), dtype=np.int64)
+        new_positions[~is_mapped] = np.arange(len(kept))
+        new_positions[is_mapped] = [
+            group_positions[mapping[sector]] for sector in old_sectors[is_mapped]
+        ]
+        # float32 ones keep the dtype of the tables in the products (see `_float_dtype`)
+        concordance = sp.csr_array(
+            (
+                np.ones(len(old_sectors), dtype=np.float32),
+                (new_positions, np.arange(len(old_sectors))),
+            ),
+            shape=(len(kept) + len(groups), len(old_sectors)),
+        )
+        new_sectors = kept.append(
+            pd.MultiIndex.from_tuples(groups, names=old_sectors.names)
+        )
+
+        # the rows and columns of the groups in C T Cᵀ, without building all of it
+        t = self.t
+        group_rows = _densify(concordance[len(kept) :] @ t.values)
+        t_rows = _densify((concordance @ group_rows.T).T)
+        group_columns = _densify(concordance[len(kept) :] @ t.values.T).T
+        t_columns = _densify(concordance @ group_columns)
+        self._pending_t = functools.partial(
+            _aggregate_t, t, concordance, new_sectors
+        )
+        self._t = None
+
+        self.x = pd.Series(concordance @ self.x.values, index=new_sectors)
+        self.y = pd.DataFrame(
+            concordance @ self.y.values, index=new_sectors, columns=self.y.columns
+        )
+        self.v = pd.DataFrame(
+            (concordance @ self.v.values.T).T, index=self.v.index, columns=new_sectors
+        )
+        self.q.f = pd.DataFrame(
+            (concordance @ self.q.f.values.T).T,
+            index=self.q.f.index,
+            columns=new_sectors,
+        )
+        self.q.a = self.q.f.div(self.x)
 
+        self._update_leontief(
+            len(old_sectors), np.flatnonzero(~is_mapped), t_columns, t_rows
+        )
+
+    def aggregate_regions(self, regions: dict[str, str]) -> None:
+        """Aggregates countries into regions, sector by sector
+
+        Args:
+            regions (dict[str, str]): Maps country codes to the name of their region
         """
-        # delete original sector
-        self.t.drop(sector, inplace=True, axis=0)
-        self.t.drop(sector, inplace=True, axis=1)
-        self.x.drop(sector, inplace=True)
-        self.y.drop(sector, inplace=True)
-        self.q.drop(sector, axis=1, inplace=True)
-        _, data = next(iter(aggregates_into))
-        first_index = data.t_columns.index
+        self.aggregate_many(
+            {
+                sector: (regions[sector[0]],) + tuple(sector[1:])
+                for sector in self.sectors
+                if sector[0] in regions
+            }
+        )
 
-        if not all(x.t_columns.index.equals(first_index) for _, x in aggregates_into):
-            raise ValueError("Not all indices are equal")
+    def dissaggregate(self, sector: tuple, aggregates_into: DisaggregatesInto) -> None:
+        """dissaggregates a sector into multiple sectors
 
-        self.t.reindex(index=data.t_columns.index, columns=data.t_rows.index)
-        for (
-            sector_name,
-            data,
-        ) in aggregates_into:  # or however you iterate over DisaggregatesInto
-            self.t[sector_name] = data.t_columns
-            self.t.loc[sector_name] = data.t_rows
+        The enlarged tables are allocated once and the new rows and columns written as one block,
+        the new sectors are appended after the remaining ones. Entries of T between two new sectors
+        are taken from `t_rows`. The Leontief solver is updated incrementally.
 
-            self.x[sector_name] = data.x
+        Args:
+            sector (tuple): The sectors that is deleted
+            aggregates_into (DisaggregatesInto): The names and accounts of the new sectors
 
-            self.y[sector_name] = data.y
+        """
+        aggregates_into = list(aggregates_into)
+        old_sectors = self.sectors
+        removed = old_sectors.get_loc(sector)
+        if not isinstance(removed, int):
+            raise ValueError(f"{sector} is not a unique sector")
+        kept = np.delete(np.arange(len(old_sectors)), removed)
+        names = [name for name, _ in aggregates_into]
+        if old_sectors[kept].isin(names).any():
+            raise ValueError("New sector names must differ from the sectors that are kept")
+        new_sectors = old_sectors[kept].append(
+            pd.MultiIndex.from_tuples(names, names=old_sectors.names)
+        )
 
-            self.v[sector_name] = data.v
+        t_dtype = _float_dtype(self.t.values)
+        columns = np.column_stack(
+            [
+                data.t_columns.reindex(new_sectors, fill_value=0).to_numpy(dtype=t_dtype)
+                for _, data in aggregates_into
+            ]
+        )
+        rows = np.vstack(
+            [
+                data.t_rows.reindex(new_sectors, fill_value=0).to_numpy(dtype=t_dtype)
+                for _, data in aggregates_into
+            ]
+        )
+        # the block between new sectors is taken from the rows
+        columns[len(kept) :] = rows[:, len(kept) :]
+        self._pending_t = functools.partial(
+            _dissaggregate_t, self.t, removed, columns, rows, new_sectors
+        )
+        self._t = None
 
-            self.q[sector_name] = data.q
+        self.x = pd.Series(
+            np.concatenate(
+                [self.x.values[kept], [data.x for _, data in aggregates_into]]
+            ).astype(_float_dtype(self.x.values), copy=False),
+            index=new_sectors,
+        )
+        new_y = np.vstack(
+            [
+                data.y.reindex(self.y.columns, fill_value=0).to_numpy(
+                    dtype=_float_dtype(self.y.values)
+                )
+                for _, data in aggregates_into
+            ]
+        )
+        self.y = pd.DataFrame(
+            np.concatenate([self.y.values[kept], new_y]),
+            index=new_sectors,
+            columns=self.y.columns,
+        )
+        new_v = np.column_stack(
+            [
+                data.v.reindex(self.v.index, fill_value=0).to_numpy(
+                    dtype=_float_dtype(self.v.values)
+                )
+                for _, data in aggregates_into
+            ]
+        )
+        self.v = pd.DataFrame(
+            np.concatenate([self.v.values[:, kept], new_v], axis=1),
+            index=self.v.index,
+            columns=new_sectors,
+        )
+        new_q = np.column_stack(
+            [
+                data.q.reindex(self.q.f.index, fill_value=0).to_numpy(
+                    dtype=_float_dtype(self.q.f.values)
+                )
+                for _, data in aggregates_into
+            ]
+        )
+        self.q.f = pd.DataFrame(
+            np.concatenate([self.q.f.values[:, kept], new_q], axis=1),
+            index=self.q.f.index,
+            columns=new_sectors,
+        )
+        self.q.a = self.q.f.div(self.x)
 
         # Recalculate derived matrices
-        self.a = self.t.divide(self.x, axis=1)
-        self.l = pd.DataFrame(
-            inv(np.eye(self.a.shape[0]) - self.a.values),
-            index=self.a.index,
-            columns=self.a.columns,
+        self._update_leontief(len(old_sectors), kept, columns, rows)
+
+
+def _float_dtype(values) -> np.dtype:
+    """The dtype a table keeps through `aggregate` and `dissaggregate`, integers become float64"""
+    return np.result_type(values.dtype, np.float32)
+
+
+def _densify(values) -> np.ndarray:
+    return values.toarray() if sp.issparse(values) else np.asarray(values)
+
+
+def _country_group(countries: Iterable[str] | str) -> tuple[str, ...]:
+    return (countries,) if isinstance(countries, str) else tuple(countries)
+
+
+def _label_positions(index: pd.MultiIndex, key: Any) -> np.ndarray:
+    """The positions of a selection of `Eora.select` in an index"""
+    if key is None:
+        return np.arange(len(index))
+    if isinstance(key, str):
+        key = (key,)
+    if isinstance(key, tuple):
+        return index.get_locs(key)
+    positions = index.get_indexer(list(key))
+    if (positions < 0).any():
+        missing = [label for label, pos in zip(key, positions) if pos < 0]
+        raise KeyError(f"Labels not in the index: {missing}")
+    return positions
+
+
+def _take_block(
+    frame: pd.DataFrame | SparseFrame, rows: np.ndarray, columns: np.ndarray
+) -> pd.DataFrame | SparseFrame:
+    """Takes the block at the row and column positions, a view if both are contiguous"""
+    index, labels = frame.index[rows], frame.columns[columns]
+    if isinstance(frame, SparseFrame):
+        return SparseFrame(sp.csr_array(frame.values[rows][:, columns]), index, labels)
+
+    values = frame.values
+    row_slice, column_slice = as_slice(rows), as_slice(columns)
+    if row_slice is not None and column_slice is not None:
+        block = values[row_slice, column_slice]
+    elif row_slice is not None:
+        block = values[row_slice][:, columns]
+    elif column_slice is not None:
+        block = values[rows, column_slice]
+    else:
+        block = values[np.ix_(rows, columns)]
+    return pd.DataFrame(block, index=index, columns=labels, copy=False)
+
+
+def _aggregate_t(
+    t: pd.DataFrame | SparseFrame, concordance: sp.csr_array, new_sectors: pd.Index
+) -> pd.DataFrame | SparseFrame:
+    """Builds C T Cᵀ"""
+    if isinstance(t, SparseFrame):
+        values = sp.csr_array(concordance @ t.values @ concordance.T)
+        return SparseFrame(values, new_sectors, new_sectors)
+    # as two sparse @ dense products, (C (C T)ᵀ)ᵀ
+    values = (concordance @ (concordance @ t.values).T).T
+    return pd.DataFrame(values, index=new_sectors, columns=new_sectors)
+
+
+def _dissaggregate_t(
+    t: pd.DataFrame | SparseFrame,
+    removed: int,
+    columns: np.ndarray,
+    rows: np.ndarray,
+    new_sectors: pd.Index,
+) -> pd.DataFrame | SparseFrame:
+    """Builds T without the `removed` sector, bordered by the new columns and rows"""
+    n_kept = t.shape[0] - 1
+    if isinstance(t, SparseFrame):
+        kept = np.delete(np.arange(n_kept + 1), removed)
+        values = sp.block_array(
+            [
+                [t.values[kept][:, kept], sp.csr_array(columns[:n_kept])],
+                [sp.csr_array(rows[:, :n_kept]), sp.csr_array(rows[:, n_kept:])],
+            ],
+            format="csr",
         )
+        return SparseFrame(values, new_sectors, new_sectors)
+
+    old = t.values
+    values = np.empty((len(new_sectors), len(new_sectors)), dtype=columns.dtype)
+    # copy the four blocks around the removed row and column without temporaries
+    values[:removed, :removed] = old[:removed, :removed]
+    values[:removed, removed:n_kept] = old[:removed, removed + 1 :]
+    values[removed:n_kept, :removed] = old[removed + 1 :, :removed]
+    values[removed:n_kept, removed:n_kept] = old[removed + 1 :, removed + 1 :]
+    values[:, n_kept:] = columns
+    values[n_kept:, :] = rows
+    return pd.DataFrame(values, index=new_sectors, columns=new_sectors)
 
 
 def test_eora() -> Eora:
@@ -265,8 +923,8 @@ def test_eora() -> Eora:
     eora.t = t
     eora.y = y
     eora.v = v
-    eora.q = q
     eora.x = eora.t.sum(axis=0) + eora.y.sum(axis=1)
+    eora.q = Extension(q, pd.DataFrame(0, index=q_index, columns=y_columns), eora.x)
     eora.a = eora.t.divide(eora.x, axis=1)
     eora.l = pd.DataFrame(
         np.linalg.inv(np.eye(eora.a.shape[0]) - eora.a.values),
@@ -317,24 +975,63 @@ def _norm_text(s: str) -> str:
     s = re.sub(r"[^a-z0-9&]+", " ", s)
     return re.sub(r"\s+", " ", s).strip()
 
-def _matches_any(text: str, patterns: Iterable[str]) -> bool:
-    t = _norm_text(text)
-    return any(re.search(p, t) for p in patterns)
 
-def _bundle_row_mask(eora, iso: str, patterns: list[str]) -> pd.Series:
-    idx = eora.t.index
-    countries = idx.get_level_values(0)
-    sectors   = idx.get_level_values(2).astype(str)
-    return (countries == iso) & sectors.to_series().apply(lambda s: _matches_any(s, patterns)).values
+@functools.lru_cache(maxsize=None)
+def _bundle_regex(patterns: tuple[str, ...]) -> re.Pattern:
+    """The patterns of a bundle compiled into a single alternation"""
+    return re.compile("|".join(f"(?:{pattern})" for pattern in patterns))
 
 
-# ---------- bundle row/col masks ----------
-def _bundle_row_mask(eora, iso: str, patterns: list[str]) -> pd.Series:
-    """Select *supplying* rows: (CountryA3==iso) & Sector matches bundle."""
-    idx = eora.t.index  # MultiIndex (CountryA3, Entity, Sector)
-    countries = idx.get_level_values(0)
-    sectors   = idx.get_level_values(2).astype(str)
-    return (countries == iso) & sectors.to_series().apply(lambda s: _matches_any(s, patterns)).values
+def _bundle_cache(eora) -> dict:
+    """The normalized sector names, pattern matches and bundle masks of the Eora, reset when its sectors change"""
+    codes = eora.codes
+    if eora._bundle_masks is None or eora._bundle_masks[0] is not codes:
+        names = [_norm_text(str(name)) for name in codes.sector_names]
+        eora._bundle_masks = (codes, {"names": names, "matches": {}, "masks": {}})
+    return eora._bundle_masks[1]
+
+
+def _bundle_matches(eora, patterns: tuple[str, ...]) -> np.ndarray:
+    """Whether each distinct sector name (`IndexCodes.sector_names`) matches the patterns"""
+    cache = _bundle_cache(eora)
+    if patterns not in cache["matches"]:
+        regex = _bundle_regex(patterns)
+        cache["matches"][patterns] = np.fromiter(
+            (regex.search(name) is not None for name in cache["names"]),
+            dtype=bool,
+            count=len(cache["names"]),
+        )
+    return cache["matches"][patterns]
+
+
+def bundle_mask(eora, iso: str, kind: str = "ICE") -> np.ndarray:
+    """Boolean mask of the sectors of `iso` in the ICE or EV bundle, over the rows (and columns) of T
+
+    The distinct sector names are normalized once and matched once per set of patterns,
+    the masks are cached on the Eora per (country, kind) until its sectors change.
+    """
+    codes = eora.codes
+    masks = _bundle_cache(eora)["masks"]
+    key = (iso, kind.upper())
+    if key not in masks:
+        ice_patterns, ev_patterns = _country_patterns(iso)
+        patterns = tuple(ice_patterns if key[1] == "ICE" else ev_patterns)
+        country = codes.countries.get_indexer([iso])[0]
+        masks[key] = (codes.country == country) & _bundle_matches(eora, patterns)[codes.sector]
+    return masks[key]
+
+
+def bundle_members(eora, kind: str = "ICE") -> np.ndarray:
+    """Mask of the sectors in the ICE or EV bundle of their own country, for all countries at once"""
+    codes = eora.codes
+    patterns = tuple(ICE_PATTERNS if kind.upper() == "ICE" else EV_PATTERNS)
+    members = _bundle_matches(eora, patterns)[codes.sector]
+    for iso in codes.countries:
+        if str(iso).upper() in COUNTRY_TWEAKS:
+            positions = codes.country_positions([iso])
+            members[positions] = bundle_mask(eora, iso, kind)[positions]
+    return members
+
 
 def _country_col_mask(eora, iso: str) -> pd.Series:
     """Select *buying* columns for a given country code."""
@@ -355,21 +1052,15 @@ def bundle_demand_stats(eora, iso: str, kind: str = "ICE", top_suppliers: int =
       - top_supplier_sectors: Series of inputs by (country, entity, sector)
       - top_supplier_countries: Series aggregated by country
     """
-    ice_patterns, ev_patterns = _country_patterns(iso)
-    patterns = ice_patterns if kind.upper() == "ICE" else ev_patterns
-
     # --- select bundle columns (buyers) ---
-    col_idx = eora.t.columns
-    col_countries = col_idx.get_level_values(0)
-    col_sectors   = col_idx.get_level_values(2).astype(str)
-    col_mask_bundle = (col_countries == iso) & pd.Series(col_sectors).apply(lambda s: _matches_any(s, patterns)).values
+    col_mask_bundle = bundle_mask(eora, iso, kind)
 
     if not col_mask_bundle.any():
         return {"total_inputs": 0, "domestic_inputs": 0, "import_inputs": 0,
                 "top_supplier_sectors": pd.Series(dtype=float),
                 "top_supplier_countries": pd.Series(dtype=float)}
 
-     = eora.t.loc[:, col_mask_bundle]
+    T_cols_bundle = eora.t.loc[:, col_mask_bundle]
 
     # total inputs
     total_inputs = T_cols_bundle.values.sum()
@@ -409,20 +1100,14 @@ def bundle_supply_stats(eora, iso: str, kind: str = "ICE", top_buyers: int = 10)
       - top_foreign_buyers: Series of exports by buyer country
       - A_intensity_by_buyer_country (optional signal): sum of A rows in bundle grouped by buyer country
     """
-    ice_patterns, ev_patterns = _country_patterns(iso)
-    patterns = ice_patterns if kind.upper() == "ICE" else ev_patterns
-
     # masks
-    row_mask = _bundle_row_mask(eora, iso, patterns)              # supplier rows (in iso, matching bundle)
+    row_mask = bundle_mask(eora, iso, kind)                        # supplier rows (in iso, matching bundle)
     dom_cols = _country_col_mask(eora, iso)                        # domestic buyers
     for_cols = _not_country_col_mask(eora, iso)                    # foreign buyers
 
     # 1) supply capacity
-    # x is indexed by columns (sectors): pick supplier columns in iso matching bundle
-    col_idx = eora.t.columns
-    col_countries = col_idx.get_level_values(0)
-    col_sectors   = col_idx.get_level_values(2).astype(str)
-    col_mask_bundle = (col_countries == iso) & pd.Series(col_sectors).apply(lambda s: _matches_any(s, patterns)).values
+    # x is indexed by columns (sectors): the supplier columns are the same sectors as the rows
+    col_mask_bundle = row_mask
     x_bundle = eora.x[col_mask_bundle].sum()
 
     # 2) value added of those supplier sectors
@@ -472,56 +1157,205 @@ def bundle_pairs_for_country(eora, iso: str) -> dict:
             "domestic_EV_to_ICE": ratio(ev["domestic_sales"], ice["domestic_sales"]),
         }
     }
+
+
+BUNDLES = ["ICE", "EV"]
+
+
+def _indicator(groups: np.ndarray, n_groups: int) -> sp.csr_array:
+    """(n_groups × n) matrix with a one at (group, position) for every position with a group >= 0"""
+    positions = np.flatnonzero(groups >= 0)
+    return sp.csr_array(
+        (np.ones(len(positions)), (groups[positions], positions)),
+        shape=(n_groups, len(groups)),
+    )
+
+
+def _ratios(n: np.ndarray, d: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where((d != 0) & np.isfinite(n) & np.isfinite(d), n / d, np.nan)
+
+
+def bundle_statistics(eora) -> dict:
+    """
+    Supply- and demand-side ICE/EV bundle statistics for all countries at once.
+
+    The sectors are grouped by their (bundle, country) codes, so the bundle rows and columns of
+    all countries are summed in a single pass over T, in chunks of CHUNK_ROWS rows.
+    Returns:
+      - summary: DataFrame by country with the totals of `bundle_pairs_for_country` (x_ICE, va_EV, exports_ICE, ...)
+                 and `bundle_demand_stats` (inputs_total_ICE, inputs_imports_EV, ...), plus the EV to ICE ratios
+      - sales: {kind: DataFrame bundle country × buyer country}, sales from the bundle rows of T
+      - a_intensity: {kind: DataFrame bundle country × buyer country}, sums of the bundle rows of A
+      - inputs: {kind: DataFrame supplier sector × bundle country}, purchases of the bundle columns of T
+    Top buyers and suppliers of a country are e.g. sales["ICE"].loc[iso].drop(iso).nlargest(10)
+    or inputs["EV"][iso].groupby(level=0).sum().nlargest(15).
+    """
+    codes = eora.codes
+    countries = codes.countries
+    n, k = len(codes.index), len(countries)
+
+    # one row per bundle and country; a sector can be in both bundles
+    bundles = sp.vstack(
+        [
+            _indicator(np.where(bundle_members(eora, kind), codes.country, -1), k)
+            for kind in BUNDLES
+        ],
+        format="csr",
+    )
+    by_country = _indicator(codes.country, k)
+
+    t = eora.t.values
+    sold = np.zeros((len(BUNDLES) * k, n))
+    bought = np.empty((n, len(BUNDLES) * k))
+    for start in range(0, n, CHUNK_ROWS):
+        rows = slice(start, min(start + CHUNK_ROWS, n))
+        chunk = t[rows]
+        sold += _densify(bundles[:, rows] @ chunk)
+        bought[rows] = _densify(bundles @ chunk.T).T
+
+    x = eora.x.to_numpy(dtype=float)
+    va = eora.v.to_numpy(dtype=float).sum(axis=0)
+    summary, sales, a_intensity, inputs = {}, {}, {}, {}
+    for i, kind in enumerate(BUNDLES):
+        group = slice(i * k, (i + 1) * k)
+        members = bundles[group]
+        flows = (by_country @ sold[group].T).T
+        with np.errstate(divide="ignore", invalid="ignore"):
+            coefficients = (by_country @ (sold[group] / x).T).T
+        purchases = by_country @ bought[:, group]
+
+        domestic = np.diagonal(flows)
+        total_inputs = bought[:, group].sum(axis=0)
+        domestic_inputs = np.diagonal(purchases)
+        summary |= {
+            f"x_{kind}": members @ x,
+            f"va_{kind}": members @ va,
+            f"domestic_{kind}": domestic,
+            f"exports_{kind}": flows.sum(axis=1) - domestic,
+            f"inputs_total_{kind}": total_inputs,
+            f"inputs_domestic_{kind}": domestic_inputs,
+            f"inputs_imports_{kind}": total_inputs - domestic_inputs,
+        }
+        sales[kind] = pd.DataFrame(flows, index=countries, columns=countries)
+        a_intensity[kind] = pd.DataFrame(coefficients, index=countries, columns=countries)
+        inputs[kind] = pd.DataFrame(bought[:, group], index=codes.index, columns=countries)
+
+    for name, numerator, denominator in [
+        ("x_EV_to_ICE", "x_EV", "x_ICE"),
+        ("va_EV_to_ICE", "va_EV", "va_ICE"),
+        ("exports_EV_to_ICE", "exports_EV", "exports_ICE"),
+        ("domestic_EV_to_ICE", "domestic_EV", "domestic_ICE"),
+        ("ratio_total_EV_to_ICE", "inputs_total_EV", "inputs_total_ICE"),
+        ("ratio_imports_EV_to_ICE", "inputs_imports_EV", "inputs_imports_ICE"),
+        ("ratio_domestic_EV_to_ICE", "inputs_domestic_EV", "inputs_domestic_ICE"),
+    ]:
+        summary[name] = _ratios(summary[numerator], summary[denominator])
+
+    return {
+        "summary": pd.DataFrame(summary, index=countries.rename("country")),
+        "sales": sales,
+        "a_intensity": a_intensity,
+        "inputs": inputs,
+    }
+
+
+def bundle_total_requirements(eora, iso: str, kind: str = "ICE") -> pd.DataFrame:
+    """
+    Total (direct and indirect) inputs per unit of output of the ICE/EV bundle sectors in `iso`.
+
+    Solves (I - A) X = A[:, bundle] with the Leontief factorization of the Eora, i.e. X = L A[:, bundle],
+    so L is never materialized.
+    Returns:
+      - DataFrame supplier sector × bundle sector
+    """
+    columns = np.flatnonzero(bundle_mask(eora, iso, kind))
+    a = _take_block(eora.a, np.arange(len(eora.sectors)), columns)
+    return pd.DataFrame(eora.solve(_densify(a.values)), index=eora.sectors, columns=a.columns)
+
+
+def bundle_backward_linkages(eora, iso: str, kind: str = "ICE", top_suppliers: int = 15) -> dict:
+    """
+    Like `bundle_demand_stats`, but with the total (direct and indirect) inputs into the output of
+    the bundle sectors in `iso`, L A[:, bundle] x_bundle = L T[:, bundle] 1, from one solve.
+    Returns:
+      - direct_inputs: sum of the inputs from T, the total_inputs of `bundle_demand_stats`
+      - total_inputs: sum of all direct and indirect inputs
+      - domestic_inputs: total inputs sourced domestically
+      - import_inputs: total inputs sourced from abroad
+      - top_supplier_sectors: Series of total inputs by (country, entity, sector)
+      - top_supplier_countries: Series of total inputs aggregated by country
+    """
+    mask = bundle_mask(eora, iso, kind)
+    direct = _densify(_take_block(eora.t, np.arange(len(mask)), np.flatnonzero(mask)).values)
+    total = pd.Series(eora.solve(direct.sum(axis=1)), index=eora.sectors)
+
+    by_country = total.groupby(level=0).sum().sort_values(ascending=False)
+    domestic_inputs = by_country.get(iso, 0.0)
+    return {
+        "direct_inputs": float(direct.sum()),
+        "total_inputs": float(total.sum()),
+        "domestic_inputs": float(domestic_inputs),
+        "import_inputs": float(total.sum() - domestic_inputs),
+        "top_supplier_sectors": total.sort_values(ascending=False).head(top_suppliers),
+        "top_supplier_countries": by_country.head(top_suppliers),
+    }
+
+
+def bundle_total_inputs(eora, inputs: dict[str, pd.DataFrame] | None = None) -> dict[str, pd.DataFrame]:
+    """
+    Total (direct and indirect) inputs of the ICE/EV bundles of all countries, from one batched solve.
+
+    Args:
+        inputs: The direct inputs, `bundle_statistics(eora)["inputs"]`, computed if not given
+    Returns:
+      - {kind: DataFrame supplier sector × bundle country}, the total inputs of `bundle_backward_linkages`
+    """
+    if inputs is None:
+        inputs = bundle_statistics(eora)["inputs"]
+    total = eora.solve(np.hstack([inputs[kind].to_numpy() for kind in BUNDLES]))
+    k = len(eora.codes.countries)
+    return {
+        kind: pd.DataFrame(
+            total[:, i * k : (i + 1) * k], index=inputs[kind].index, columns=inputs[kind].columns
+        )
+        for i, kind in enumerate(BUNDLES)
+    }
+
+
 if __name__ == "__main__":
     data_dir = "data/eora"
     eora = Eora(data_dir)
     print("Loaded Eora from:", data_dir)
 
+    # all countries in one pass over T
+    stats = bundle_statistics(eora)
+    summary = stats["summary"]
+
     countries = ["DEU","FRA","ITA","ESP","CHN"]
-    rows = []
     for iso in countries:
-        out = bundle_pairs_for_country(eora, iso)
-        ice, ev, r = out["ICE"], out["EV"], out["ratios"]
+        row = summary.loc[iso]
 
         print(f"\n=== {iso} ===")
-        print(f"ICE  — x:{ice['x_bundle']:.3g}  VA:{ice['va_bundle']:.3g}  domestic:{ice['domestic_sales']:.3g}  exports:{ice['export_sales']:.3g}")
-        print(f"EV   — x:{ev['x_bundle']:.3g}  VA:{ev['va_bundle']:.3g}  domestic:{ev['domestic_sales']:.3g}  exports:{ev['export_sales']:.3g}")
-        print("Top foreign buyers of ICE bundle:\n", ice["top_foreign_buyers"])
-        print("Top foreign buyers of EV  bundle:\n", ev["top_foreign_buyers"])
-
-        rows.append({
-            "country": iso,
-            "x_ICE": ice["x_bundle"], "x_EV": ev["x_bundle"], "x_EV_to_ICE": r["x_EV_to_ICE"],
-            "va_ICE": ice["va_bundle"], "va_EV": ev["va_bundle"], "va_EV_to_ICE": r["va_EV_to_ICE"],
-            "domestic_ICE": ice["domestic_sales"], "domestic_EV": ev["domestic_sales"],
-            "exports_ICE": ice["export_sales"], "exports_EV": ev["export_sales"],
-            "exports_EV_to_ICE": r["exports_EV_to_ICE"], "domestic_EV_to_ICE": r["domestic_EV_to_ICE"],
-        })
+        print(f"ICE  — x:{row['x_ICE']:.3g}  VA:{row['va_ICE']:.3g}  domestic:{row['domestic_ICE']:.3g}  exports:{row['exports_ICE']:.3g}")
+        print(f"EV   — x:{row['x_EV']:.3g}  VA:{row['va_EV']:.3g}  domestic:{row['domestic_EV']:.3g}  exports:{row['exports_EV']:.3g}")
+        print("Top foreign buyers of ICE bundle:\n", stats["sales"]["ICE"].loc[iso].drop(iso).nlargest(10))
+        print("Top foreign buyers of EV  bundle:\n", stats["sales"]["EV"].loc[iso].drop(iso).nlargest(10))
 
     # ----- BACKWARD LINKAGES: save a tidy summary for all countries -----
-    rows_back = []
-    for iso in countries:
-        back_ice = bundle_demand_stats(eora, iso, "ICE", top_suppliers=10)
-        back_ev = bundle_demand_stats(eora, iso, "EV", top_suppliers=10)
-
-
-        def ratio(n, d):
-            return (n / d) if d else np.nan
-
-
-        rows_back.append({
-            "country": iso,
-            "inputs_total_ICE": back_ice["total_inputs"],
-            "inputs_domestic_ICE": back_ice["domestic_inputs"],
-            "inputs_imports_ICE": back_ice["import_inputs"],
-            "inputs_total_EV": back_ev["total_inputs"],
-            "inputs_domestic_EV": back_ev["domestic_inputs"],
-            "inputs_imports_EV": back_ev["import_inputs"],
-            "ratio_total_EV_to_ICE": ratio(back_ev["total_inputs"], back_ice["total_inputs"]),
-            "ratio_imports_EV_to_ICE": ratio(back_ev["import_inputs"], back_ice["import_inputs"]),
-            "ratio_domestic_EV_to_ICE": ratio(back_ev["domestic_inputs"], back_ice["domestic_inputs"]),
-        })
+    backward_columns = [
+        "inputs_total_ICE", "inputs_domestic_ICE", "inputs_imports_ICE",
+        "inputs_total_EV", "inputs_domestic_EV", "inputs_imports_EV",
+        "ratio_total_EV_to_ICE", "ratio_imports_EV_to_ICE", "ratio_domestic_EV_to_ICE",
+    ]
+
+    # direct and indirect inputs, without materializing L
+    for kind, total in bundle_total_inputs(eora, stats["inputs"]).items():
+        by_country = total.groupby(level=0).sum().reindex(total.columns)
+        summary[f"requirements_total_{kind}"] = by_country.sum().to_numpy()
+        summary[f"requirements_imports_{kind}"] = (by_country.sum() - np.diagonal(by_country)).to_numpy()
+        backward_columns += [f"requirements_total_{kind}", f"requirements_imports_{kind}"]
 
     os.makedirs("outputs", exist_ok=True)
-    pd.DataFrame(rows_back).to_csv("outputs/bundle_backward_summary.csv", index=False)
+    summary[backward_columns].reset_index().to_csv("outputs/bundle_backward_summary.csv", index=False)
     print("Saved: outputs/bundle_backward_summary.csv")
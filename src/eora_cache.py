@@ -0,0 +1,170 @@
+import json
+import os
+import pandas as pd
+import numpy as np
+from scipy import sparse
+from src.sparse_frame import SparseFrame
+
+CACHE_DIR = ".eora_cache"
+MANIFEST = "manifest.json"
+CACHE_VERSION = 2
+
+Frame = pd.DataFrame | SparseFrame
+
+
+def cache_dir(path: str) -> str:
+    return os.path.join(path, CACHE_DIR)
+
+
+def source_signature(path: str, sources: list[str]) -> dict[str, list[int]]:
+    """Returns the (mtime, size) of every source file, used to invalidate the cache"""
+    signature = {}
+    for source in sources:
+        stat = os.stat(os.path.join(path, source))
+        signature[source] = [stat.st_mtime_ns, stat.st_size]
+    return signature
+
+
+def _read_manifest(path: str) -> dict | None:
+    manifest_path = os.path.join(cache_dir(path), MANIFEST)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def _write_manifest(path: str, manifest: dict) -> None:
+    manifest_path = os.path.join(cache_dir(path), MANIFEST)
+    tmp_path = manifest_path + f".{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, manifest_path)
+
+
+def _kind(frame: Frame) -> str:
+    return "sparse" if isinstance(frame, SparseFrame) else "dense"
+
+
+def _write_frame(directory: str, name: str, frame: Frame) -> None:
+    # written to a temporary file and renamed, so that readers that memory map
+    # the old file are not affected and concurrent writers do not interleave
+    if isinstance(frame, SparseFrame):
+        tmp_path = os.path.join(directory, f"{name}.{os.getpid()}.tmp.npz")
+        sparse.save_npz(tmp_path, frame.values)
+        os.replace(tmp_path, os.path.join(directory, name + ".npz"))
+        stale = os.path.join(directory, name + ".npy")
+    else:
+        tmp_path = os.path.join(directory, f"{name}.{os.getpid()}.tmp.npy")
+        np.save(tmp_path, frame.to_numpy())
+        os.replace(tmp_path, os.path.join(directory, name + ".npy"))
+        stale = os.path.join(directory, name + ".npz")
+    # a frame rewritten in the other kind
+    if os.path.exists(stale):
+        os.remove(stale)
+    pd.to_pickle(frame.index, os.path.join(directory, name + "_index.pkl"))
+    pd.to_pickle(frame.columns, os.path.join(directory, name + "_columns.pkl"))
+
+
+def is_valid(path: str, sources: list[str], dtype: str | None = None) -> bool:
+    """Checks whether the cache exists and was written from the current sources
+
+    Args:
+        dtype (str | None): If given, the tables must also have been cached with this dtype
+    """
+    manifest = _read_manifest(path)
+    if manifest is None or manifest.get("version") != CACHE_VERSION:
+        return False
+    if dtype is not None and manifest.get("dtype", "float64") != dtype:
+        return False
+    return manifest.get("sources") == source_signature(path, sources)
+
+
+def cached_frames(path: str) -> dict[str, str]:
+    """Returns the names of the cached frames mapped to their kind (dense or sparse)"""
+    manifest = _read_manifest(path)
+    return {} if manifest is None else manifest["frames"]
+
+
+def write_frames(
+    path: str, frames: dict[str, Frame], sources: list[str], dtype: str = "float64"
+) -> None:
+    """Writes dense frames as .npy blocks and sparse frames as .npz, plus pickled index sidecars
+
+    Args:
+        path (str): The data directory, the cache is created as a subdirectory
+        frames (dict[str, Frame]): The frames to store, keyed by name
+        sources (list[str]): The source files the frames were read from
+        dtype (str): The dtype the tables were read as
+    """
+    directory = cache_dir(path)
+    os.makedirs(directory, exist_ok=True)
+    # drop the manifest first, so that an interrupted write is never picked up
+    manifest_path = os.path.join(directory, MANIFEST)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+
+    for name, frame in frames.items():
+        _write_frame(directory, name, frame)
+
+    _write_manifest(
+        path,
+        {
+            "version": CACHE_VERSION,
+            "frames": {name: _kind(frame) for name, frame in frames.items()},
+            "sources": source_signature(path, sources),
+            "dtype": dtype,
+        },
+    )
+
+
+def append_frames(path: str, frames: dict[str, Frame]) -> None:
+    """Adds derived frames (e.g. A or L) to an existing, valid cache"""
+    manifest = _read_manifest(path)
+    if manifest is None:
+        raise FileNotFoundError(f"No Eora cache in {cache_dir(path)}")
+
+    for name, frame in frames.items():
+        _write_frame(cache_dir(path), name, frame)
+
+    manifest["frames"].update({name: _kind(frame) for name, frame in frames.items()})
+    _write_manifest(path, manifest)
+
+
+def read_frame(path: str, name: str, mmap: bool = False) -> Frame:
+    """Reads a cached frame
+
+    Args:
+        path (str): The data directory
+        name (str): The name of the frame
+        mmap (bool): If true dense values are a read-only np.memmap of the .npy file,
+                     so that several processes share one physical copy through the page cache.
+                     Sparse frames are always read into memory.
+    """
+    directory = cache_dir(path)
+    index = pd.read_pickle(os.path.join(directory, name + "_index.pkl"))
+    columns = pd.read_pickle(os.path.join(directory, name + "_columns.pkl"))
+    if cached_frames(path).get(name) == "sparse":
+        values = sparse.csr_array(sparse.load_npz(os.path.join(directory, name + ".npz")))
+        return SparseFrame(values, index, columns)
+    values = np.load(os.path.join(directory, name + ".npy"), mmap_mode="r" if mmap else None)
+    return pd.DataFrame(values, index=index, columns=columns, copy=False)
+
+
+def read_frames(
+    path: str,
+    sources: list[str],
+    mmap: bool = False,
+    names: list[str] | None = None,
+    dtype: str | None = None,
+) -> dict[str, Frame] | None:
+    """Reads the cached frames, returns None if the cache is missing or stale
+
+    Args:
+        names (list[str] | None): Only read these frames (if cached), defaults to all
+        dtype (str | None): Treat a cache written with another dtype as stale
+    """
+    if not is_valid(path, sources, dtype):
+        return None
+    cached = cached_frames(path)
+    names = list(cached) if names is None else [name for name in names if name in cached]
+    return {name: read_frame(path, name, mmap) for name in names}
@@ -4,20 +4,30 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 
-eora = eo.Eora("data/full_eora")
+eora = eo.Eora("data/full_eora", lazy=True)
 
-eora.t.loc["FRA", "Commodities", "Motor vehicles, trailers and semi-trailers"].T.nlargest(50, columns=("FRA", "Commodities", "Motor vehicles, trailers and semi-trailers"))
 
-eora.t["FRA", "Commodities", "Motor vehicles, trailers and semi-trailers"].nlargest(50, columns=("FRA", "Commodities", "Motor vehicles, trailers and semi-trailers"))
-eora.t.loc["DEU", "Commodities", "Passenger cars and parts"].T.nlargest(50, columns=("DEU", "Commodities", "Passenger cars and parts"))
-eora.t["DEU", "Commodities", "Passenger cars and parts"].nlargest(50, columns=("DEU", "Commodities", "Passenger cars and parts"))
+def sales(sector, n=50):
+    """The largest buyers of the sector, only its row of T is read"""
+    return eora.select("t", [sector]).T.nlargest(n, columns=sector)
 
-eora.t.loc["CHN", "Commodities", "Motor vehicles"].T.nlargest(50, columns=("CHN", "Commodities", "Motor vehicles"))
-eora.t["CHN", "Commodities", "Motor vehicles"].nlargest(50, columns=("CHN", "Commodities", "Motor vehicles"))
 
+def purchases(sector, n=50):
+    """The largest suppliers of the sector, only its column of T is read"""
+    return eora.select("t", None, [sector]).nlargest(n, columns=sector)
 
-eora.t.loc["JPN", "Commodities", "Passenger motor cars"].T.nlargest(50, columns=("JPN", "Commodities", "Passenger motor cars"))
-eora.t["JPN", "Commodities", "Passenger motor cars"].nlargest(50, columns=("JPN", "Commodities", "Passenger motor cars"))
+
+sales(("FRA", "Commodities", "Motor vehicles, trailers and semi-trailers"))
+purchases(("FRA", "Commodities", "Motor vehicles, trailers and semi-trailers"))
+sales(("DEU", "Commodities", "Passenger cars and parts"))
+purchases(("DEU", "Commodities", "Passenger cars and parts"))
+
+sales(("CHN", "Commodities", "Motor vehicles"))
+purchases(("CHN", "Commodities", "Motor vehicles"))
+
+
+sales(("JPN", "Commodities", "Passenger motor cars"))
+purchases(("JPN", "Commodities", "Passenger motor cars"))
 
 eora.aggregate(
     [("JPN","Commodities", "Passenger motor cars"),
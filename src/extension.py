@@ -4,9 +4,20 @@ import pandas as pd
 class Extension:
     f: pd.DataFrame
     f_y: pd.DataFrame
-    a: pd.DataFrame
+    _a: pd.DataFrame | None = None
 
     def __init__(self, f: pd.DataFrame, f_y: pd.DataFrame, x: pd.Series) -> None:
         self.f = f
         self.f_y = f_y
-        self.a = f.div(x)
+        self._x = x
+
+    @property
+    def a(self) -> pd.DataFrame:
+        """The coefficients f / x, only computed when accessed"""
+        if self._a is None:
+            self._a = self.f.div(self._x)
+        return self._a
+
+    @a.setter
+    def a(self, a: pd.DataFrame) -> None:
+        self._a = a
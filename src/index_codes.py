@@ -0,0 +1,76 @@
+from typing import Iterable
+import numpy as np
+import pandas as pd
+
+
+class IndexCodes:
+    """Integer codes of a (country, entity, sector) MultiIndex
+
+    Turns label selections into position arrays, so that blocks of T, A or L are taken by
+    plain NumPy fancy indexing instead of MultiIndex lookups.
+
+    Attributes:
+        index (pd.MultiIndex): The index the codes were computed for
+        countries (pd.Index): The distinct countries, in order of first appearance
+        entities (pd.Index): The distinct entities
+        sector_names (pd.Index): The distinct sector names (the last index level)
+        country (np.ndarray): The country code of every position
+        entity (np.ndarray): The entity code of every position
+        sector (np.ndarray): The sector name code of every position
+    """
+
+    index: pd.MultiIndex
+    countries: pd.Index
+    entities: pd.Index
+    sector_names: pd.Index
+    country: np.ndarray
+    entity: np.ndarray
+    sector: np.ndarray
+
+    def __init__(self, index: pd.MultiIndex) -> None:
+        self.index = index
+        self.country, self.countries = pd.factorize(index.get_level_values(0))
+        self.entity, self.entities = pd.factorize(index.get_level_values(1))
+        self.sector, self.sector_names = pd.factorize(index.get_level_values(2))
+
+        # positions of every country, sorted by code with the positions of each code in order
+        order = np.argsort(self.country, kind="stable")
+        bounds = np.searchsorted(self.country[order], np.arange(len(self.countries) + 1))
+        self._country_positions = {
+            country: order[bounds[i] : bounds[i + 1]]
+            for i, country in enumerate(self.countries)
+        }
+        self._label_positions = {label: i for i, label in enumerate(index)}
+
+    def country_positions(self, countries: Iterable[str]) -> np.ndarray:
+        """Returns the positions of all sectors of the countries, in the order of the countries
+
+        Raises:
+            KeyError: If a country is not in the index
+        """
+        blocks = [self._country_positions[country] for country in countries]
+        return np.concatenate(blocks) if blocks else np.array([], dtype=np.intp)
+
+    def country_slice(self, country: str) -> slice | None:
+        """Returns the slice of the country's sectors, None if they are not contiguous"""
+        return as_slice(self._country_positions[country])
+
+    def sector_positions(self, sectors: Iterable[tuple]) -> np.ndarray:
+        """Returns the positions of full (country, entity, sector) labels
+
+        Raises:
+            KeyError: If a label is not in the index
+        """
+        return np.fromiter(
+            (self._label_positions[sector] for sector in sectors), dtype=np.intp
+        )
+
+
+def as_slice(positions: np.ndarray) -> slice | None:
+    """Returns positions as an equivalent slice, None if they are not contiguous and increasing"""
+    if len(positions) == 0:
+        return None
+    start = positions[0]
+    if positions[-1] - start + 1 != len(positions) or np.any(np.diff(positions) != 1):
+        return None
+    return slice(int(start), int(start) + len(positions))
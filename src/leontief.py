@@ -0,0 +1,175 @@
+import numpy as np
+from scipy import sparse
+from scipy.linalg import lu_factor, lu_solve
+from scipy.sparse.linalg import splu
+
+
+class LeontiefSolver:
+    """Solves (I - A) x = y with a cached LU factorization of I - A
+
+    Dense coefficient matrices are factorized with LAPACK, sparse ones with SuperLU,
+    which keeps the factors sparse for block structured tables like the full Eora.
+
+    Attributes:
+        n (int): The number of sectors
+        depth (int): Always 0, see `BorderedSolver`
+    """
+
+    n: int
+    depth: int = 0
+
+    def __init__(self, a: np.ndarray | sparse.sparray) -> None:
+        """
+        Factorizes I - A, which costs O(n³) once for dense A; every solve afterwards is O(n²) per column.
+
+        Parameters:
+            a (np.ndarray | sparse.sparray): The technical coefficients matrix
+        """
+        self.n = a.shape[0]
+        self._lu = None
+        self._splu = None
+        if sparse.issparse(a):
+            i_minus_a = sparse.csc_array(sparse.eye_array(self.n) - a)
+            self._splu = splu(i_minus_a)
+        else:
+            i_minus_a = np.eye(self.n) - a
+            self._lu = lu_factor(i_minus_a, overwrite_a=True, check_finite=False)
+
+    @property
+    def is_sparse(self) -> bool:
+        return self._splu is not None
+
+    def solve(self, y: np.ndarray) -> np.ndarray:
+        """Returns L @ y for a single demand vector (n,) or a demand block (n, k)"""
+        y = np.asarray(y, dtype=float)
+        if self._splu is not None:
+            return self._splu.solve(y)
+        return lu_solve(self._lu, y, check_finite=False)
+
+    def solve_transposed(self, y: np.ndarray) -> np.ndarray:
+        """Returns Lᵀ @ y, e.g. to get the multipliers s @ L of an intensity row s"""
+        y = np.asarray(y, dtype=float)
+        if self._splu is not None:
+            return self._splu.solve(y, trans="T")
+        return lu_solve(self._lu, y, trans=1, check_finite=False)
+
+    def inverse(self) -> np.ndarray:
+        """Materializes the full (dense) Leontief inverse"""
+        return self.solve(np.eye(self.n))
+
+
+def _factor(m: np.ndarray):
+    """LU factorization of a small block, None if the block is empty"""
+    return lu_factor(m, check_finite=False) if m.size else None
+
+
+def _solve(lu, y: np.ndarray) -> np.ndarray:
+    return y if lu is None else lu_solve(lu, y, check_finite=False)
+
+
+class ExplicitInverseSolver:
+    """Solver interface around an already materialized (e.g. memory mapped) Leontief inverse"""
+
+    n: int
+    depth: int = 0
+
+    def __init__(self, l: np.ndarray) -> None:
+        self.n = l.shape[0]
+        self._l = l
+
+    def solve(self, y: np.ndarray) -> np.ndarray:
+        return self._l @ np.asarray(y, dtype=float)
+
+    def solve_transposed(self, y: np.ndarray) -> np.ndarray:
+        return self._l.T @ np.asarray(y, dtype=float)
+
+    def inverse(self) -> np.ndarray:
+        return np.array(self._l)
+
+
+class BorderedSolver:
+    """Solver for a table derived from another one by removing and appending sectors
+
+    The new I - A is
+        [[B_kk, c],
+         [r,    d]]
+    where B_kk is the block of the old I - A for the kept sectors (unchanged, because their
+    columns in T and their output are unchanged), and c, r, d border it with the m appended sectors.
+
+    Solves reuse the old factorization: B_kk⁻¹ follows from the old solver by a correction of
+    rank k (the number of removed sectors), the border is eliminated through its m×m Schur complement.
+    Setting up an update costs 2(k + m) solves with the old factorization instead of a new O(n³)
+    factorization, every solve afterwards one old solve plus O(n (k + m)).
+
+    Attributes:
+        n (int): The number of sectors after the update
+        depth (int): The number of updates stacked on the last full factorization
+    """
+
+    n: int
+    depth: int
+
+    def __init__(
+        self,
+        base,
+        kept: np.ndarray,
+        c: np.ndarray,
+        r: np.ndarray,
+        d: np.ndarray,
+    ) -> None:
+        """
+        Parameters:
+            base: The solver of the old table (LeontiefSolver or another BorderedSolver)
+            kept (np.ndarray): Positions of the kept sectors in the old table, in their new order
+            c (np.ndarray): (k, m) block of the new I - A, kept rows × appended columns
+            r (np.ndarray): (m, k) block of the new I - A, appended rows × kept columns
+            d (np.ndarray): (m, m) block of the new I - A for the appended sectors
+        """
+        self._base = base
+        self._kept = np.asarray(kept)
+        self._removed = np.setdiff1d(np.arange(base.n), self._kept)
+        self.n = len(self._kept) + d.shape[0]
+        self.depth = getattr(base, "depth", 0) + 1
+
+        # columns of the old inverse belonging to removed sectors, for the deletion correction
+        unit = np.zeros((base.n, len(self._removed)))
+        unit[self._removed, np.arange(len(self._removed))] = 1
+        self._g = base.solve(unit)
+        self._g_t = base.solve_transposed(unit)
+        self._h = _factor(self._g[self._removed])
+        self._h_t = _factor(self._g_t[self._removed])
+
+        self._c, self._r = c, r
+        self._binv_c = self._solve_kept(c, transposed=False)
+        self._binv_r_t = self._solve_kept(r.T, transposed=True)
+        self._schur = _factor(d - r @ self._binv_c)
+        self._schur_t = _factor(d.T - c.T @ self._binv_r_t)
+
+    def _solve_kept(self, y: np.ndarray, transposed: bool) -> np.ndarray:
+        """Solves with B_kk (or its transpose) using the old factorization"""
+        embedded = np.zeros((self._base.n,) + y.shape[1:])
+        embedded[self._kept] = y
+        if transposed:
+            w = self._base.solve_transposed(embedded)
+            g, h = self._g_t, self._h_t
+        else:
+            w = self._base.solve(embedded)
+            g, h = self._g, self._h
+        return w[self._kept] - g[self._kept] @ _solve(h, w[self._removed])
+
+    def solve(self, y: np.ndarray) -> np.ndarray:
+        y = np.asarray(y, dtype=float)
+        k = len(self._kept)
+        z = self._solve_kept(y[:k], transposed=False)
+        new = _solve(self._schur, y[k:] - self._r @ z)
+        return np.concatenate([z - self._binv_c @ new, new])
+
+    def solve_transposed(self, y: np.ndarray) -> np.ndarray:
+        y = np.asarray(y, dtype=float)
+        k = len(self._kept)
+        z = self._solve_kept(y[:k], transposed=True)
+        new = _solve(self._schur_t, y[k:] - self._c.T @ z)
+        return np.concatenate([z - self._binv_r_t @ new, new])
+
+    def inverse(self) -> np.ndarray:
+        return self.solve(np.eye(self.n))
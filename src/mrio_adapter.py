@@ -0,0 +1,103 @@
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+from src.eora import Eora
+from src.leontief import LeontiefSolver
+
+
+@dataclass
+class Account:
+    """A satellite account in pymrio's layout
+
+    Attributes:
+        F (pd.DataFrame): The totals per sector
+        S (pd.DataFrame): The totals per unit of output
+    """
+
+    F: pd.DataFrame
+    S: pd.DataFrame
+
+
+class PymrioAdapter:
+    """The interface of the share functions for a pymrio IOSystem, all attributes are passed through"""
+
+    def __init__(self, io) -> None:
+        self._io = io
+
+    def __getattr__(self, name: str):
+        return getattr(self._io, name)
+
+    @property
+    def sectors(self) -> pd.Index:
+        return self._io.L.index
+
+    def solve(self, y: np.ndarray) -> np.ndarray:
+        """Returns L @ y"""
+        return self._io.L.to_numpy() @ y
+
+    def sub_solver(self, countries: list[str]) -> LeontiefSolver:
+        return LeontiefSolver(self._io.A.loc[countries, countries].to_numpy())
+
+    def block(
+        self, rows: list[str] | str, columns: list[str] | str, matrix: str = "L"
+    ) -> pd.DataFrame:
+        """Returns the submatrix of Z, A or L between the sectors of two country groups"""
+        return getattr(self._io, matrix.upper()).loc[rows, columns]
+
+
+class EoraAdapter:
+    """The interface of the share functions for a `src.eora.Eora`
+
+    Exposes y, a, t, q and v under pymrio's names (Y, A, Z, Q, VA). Leontief products go through
+    `Eora.solve`, so L is only materialized if a share function takes blocks of it
+    (`embodied_*` and friends do not) or the Eora is memory mapped. A and Z are dense copies for a sparse Eora,
+    the share functions take blocks of them through `block` instead.
+    """
+
+    def __init__(self, eora: Eora) -> None:
+        self._eora = eora
+        self.Y = eora.y
+        self.Q = Account(F=eora.q.f, S=eora.q.a)
+        # the value added rows are labelled (TOT, Primary input, label) in the full Eora
+        v = eora.v.droplevel(0) if eora.v.index.nlevels == 3 else eora.v
+        self.VA = Account(F=v, S=v.div(eora.x, axis=1))
+
+    @property
+    def sectors(self) -> pd.Index:
+        return self._eora.sectors
+
+    @property
+    def A(self) -> pd.DataFrame:
+        a = self._eora.a
+        return a if isinstance(a, pd.DataFrame) else a.to_dense()
+
+    @property
+    def Z(self) -> pd.DataFrame:
+        t = self._eora.t
+        return t if isinstance(t, pd.DataFrame) else t.to_dense()
+
+    @property
+    def L(self) -> pd.DataFrame:
+        return self._eora.l
+
+    def solve(self, y: np.ndarray) -> np.ndarray:
+        return self._eora.solve(y)
+
+    def sub_solver(self, countries: list[str]) -> LeontiefSolver:
+        return self._eora.sub_solver(countries)
+
+    def block(
+        self, rows: list[str] | str, columns: list[str] | str, matrix: str = "L"
+    ) -> pd.DataFrame:
+        """`Eora.block` of "Z", "A" or "L", dense, a sparse Eora only densifies the block"""
+        block = self._eora.block(rows, columns, {"Z": "t", "A": "a", "L": "l"}[matrix.upper()])
+        return block if isinstance(block, pd.DataFrame) else block.to_dense()
+
+
+def as_mrio(eora) -> PymrioAdapter | EoraAdapter:
+    """Wraps a pymrio IOSystem or a `src.eora.Eora` for the share functions"""
+    if isinstance(eora, (PymrioAdapter, EoraAdapter)):
+        return eora
+    if isinstance(eora, Eora):
+        return EoraAdapter(eora)
+    return PymrioAdapter(eora)
@@ -0,0 +1,95 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Iterable
+import numpy as np
+import pandas as pd
+import pymrio
+from src import eora_cache
+
+# where the Eora26 zip of a year is stored
+DATA_PATH = "data/{year}"
+
+
+def year_path(year: int) -> str:
+    return DATA_PATH.format(year=year)
+
+
+def _sources(path: str) -> list[str]:
+    """The downloaded files of a year, the cache directory is skipped"""
+    return sorted(
+        name
+        for name in os.listdir(path)
+        if not name.startswith(".") and os.path.isfile(os.path.join(path, name))
+    )
+
+
+def cache_year(year: int, path: str | None = None) -> str:
+    """Parses the year with pymrio into the binary cache, unless it is cached already
+
+    Only Z and Y are stored, the panel functions never need the calculated accounts.
+
+    Returns:
+        str: The data directory of the year
+    """
+    path = path or year_path(year)
+    sources = _sources(path)
+    if not eora_cache.is_valid(path, sources):
+        eora = pymrio.parse_eora26(year=year, path=path)
+        eora_cache.write_frames(path, {"z": eora.Z, "y": eora.Y}, sources)
+    return path
+
+
+def load_year(year: int, path: str | None = None, mmap: bool = True) -> dict[str, pd.DataFrame]:
+    """Returns Z and Y of the year from the binary cache, memory mapped by default"""
+    path = cache_year(year, path)
+    return eora_cache.read_frames(path, _sources(path), mmap)
+
+
+def map_years(
+    func: Callable[[int], Any], years: Iterable[int], processes: int | None = None
+) -> dict[int, Any]:
+    """Runs func(year) for every year in a process pool
+
+    The pool uses the default start method, so scripts calling it need a `__main__` guard
+    and func must be importable (a module level function or a partial of one).
+
+    Args:
+        func (Callable[[int], Any]): Computes the result of one year, e.g. from `load_year`
+        years (Iterable[int]): The years
+        processes (int | None): The number of worker processes, defaults to the number of cores
+    """
+    years = list(years)
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        return dict(zip(years, pool.map(func, years)))
+
+
+def stack(results: dict[int, Any]) -> pd.Series | pd.DataFrame | np.ndarray:
+    """Stacks the results of `map_years`
+
+    Series and DataFrames are concatenated with an outer "year" index level,
+    everything else is stacked into an array with the years along the first axis.
+    """
+    values = list(results.values())
+    if isinstance(values[0], (pd.Series, pd.DataFrame)):
+        return pd.concat(results, names=["year"])
+    return np.stack([np.asarray(value) for value in values])
+
+
+def sector_flows(
+    year: int, sector: str, regions: dict[str, str], path: str | None = None
+) -> pd.DataFrame:
+    """Intermediate flows sold by one sector, between groups of regions
+
+    Args:
+        year (int): The year
+        sector (str): The selling sector
+        regions (dict[str, str]): Maps every region to its group, e.g. from `coco.agg_conc`
+
+    Returns:
+        pd.DataFrame: Selling region groups × buying region groups, summed over the buying sectors
+    """
+    z = load_year(year, path)["z"]
+    rows = z.index.get_level_values(1) == sector
+    flows = z.loc[rows]
+    flows = flows.T.groupby(flows.columns.get_level_values(0).map(regions)).sum().T
+    return flows.groupby(flows.index.get_level_values(0).map(regions)).sum()
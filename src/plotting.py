@@ -1,54 +1,54 @@
 import geopandas as gpd
 import matplotlib.pyplot as plt
-import pandas as pd
-from src.share_functions import ptt, co2_shares
+from src.share_functions import ptt_matrix, co2_share_variants, calc_lean
+from src.result_cache import ResultCache
 import json
 import pymrio
 
 # Load the built-in world dataset
-eora = pymrio.parse_eora26(year=2017, path="data/" + str(2017)).calc_all()
+# results are cached on disk, the Eora is only parsed if one of them is missing
+results = ResultCache(
+    "data/" + str(2017),
+    load=lambda: calc_lean(pymrio.parse_eora26(year=2017, path="data/" + str(2017))),
+)
 url = "https://naciscdn.org/naturalearth/110m/cultural/ne_110m_admin_0_countries.zip"
 
 world = gpd.read_file(url)
 
 plot_dir = "results/plots"
 with open("data/north_codes.json") as f:
-    north_codes = list(set(json.load(f)))
+    north_codes = sorted(set(json.load(f)))
 
 with open("data/south_codes.json") as f:
-    south_codes = list(set(json.load(f)))
+    south_codes = sorted(set(json.load(f)))
 
 with open("data/eu_codes.json") as f:
-    eu_codes = list(set(json.load(f)))
+    eu_codes = sorted(set(json.load(f)))
 
 # removes Guinnea-Bissau
 with open("data/Low_income.json") as f:
-    low_income_codes = list(set(json.load(f)))
+    low_income_codes = sorted(set(json.load(f)))
 
 # removed 'FSM' 'TLS' 'COM' 'KIR' 'SLB'
 with open("data/Lower_middle_income.json") as f:
-    lower_middle_income_codes = list(set(json.load(f)))
+    lower_middle_income_codes = sorted(set(json.load(f)))
 
 # removes 'TON' 'XKX' 'DMA' 'LCA' 'MHL' 'GNQ' 'GRD' 'VCT' 'TUV'
 with open("data/Upper_middle_income.json") as f:
-    upper_middle_income_codes = list(set(json.load(f)))
+    upper_middle_income_codes = sorted(set(json.load(f)))
 
 # removed 'MAF' 'IMN' 'SXM' 'CHI' 'NRU' 'MNP' 'GIB' 'FRO' 'KNA' 'PRI' 'TCA' 'CUW' 'ASM' 'GUM' 'VIR' 'PLW'
 with open("data/High_income.json") as f:
-    high_income_codes = list(set(json.load(f)))
+    high_income_codes = sorted(set(json.load(f)))
 
 
 def plot(from_codes, to_codes, to_codes_name):
     non_from_to = [el for el in to_codes if el not in from_codes]
-    non_from_to_wo_russia_and_china = [
-        el for el in non_from_to if el != "RUS" and el != "CHN" and el != "IND"
-    ]
 
     ptt_df = (
-        pd.Series(
-            [ptt(eora, from_codes, el) for el in non_from_to],
-            index=non_from_to,
-        )
+        results(ptt_matrix, from_codes, non_from_to)
+        .loc["from"]
+        .rename_axis(None)
         .rename(index={"SUD": "SDN"})
         .rename("ptt")
         .reset_index()
@@ -56,10 +56,16 @@ def plot(from_codes, to_codes, to_codes_name):
     )
     ptt_df = ptt_df[ptt_df["ptt"] > 1]
 
+    shares = results(
+        co2_share_variants,
+        from_codes,
+        non_from_to,
+        exclusions={"all": [], "without": ["RUS", "CHN", "IND"]},
+    )
     co2_shares_df = (
-        co2_shares(eora, from_codes, non_from_to_wo_russia_and_china)
-        .sum()
-        .div(co2_shares(eora, from_codes, non_from_to).sum().sum())
+        shares["without"]
+        .dropna()
+        .div(shares["all"].sum())
         .groupby(level=[0])
         .sum()
         .rename("co2_share")
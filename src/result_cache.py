@@ -0,0 +1,197 @@
+import hashlib
+import inspect
+import json
+import os
+from typing import Any, Callable
+import pandas as pd
+
+CACHE_DIR = ".results_cache"
+# digests of the dataset files, reused as long as their mtime and size are unchanged
+DIGESTS = "digests.json"
+MAX_BYTES = 1 << 30
+
+
+def _normalize(value: Any) -> Any:
+    """Turns arguments into a json serializable key
+
+    Sequences and dicts keep their order, results (e.g. their rows or columns) may follow it.
+    Only sets are sorted, their order is arbitrary.
+    """
+    if isinstance(value, str) or value is None or isinstance(value, (int, float, bool)):
+        return value
+    if isinstance(value, dict):
+        return [[_normalize(key), _normalize(item)] for key, item in value.items()]
+    if isinstance(value, (list, tuple, pd.Index)):
+        return [_normalize(item) for item in value]
+    if isinstance(value, (set, frozenset)):
+        # tagged, so that a set is not keyed like the sorted list of its items
+        return {"set": sorted((_normalize(item) for item in value), key=json.dumps)}
+    return repr(value)
+
+
+def _source_digest(obj: Any) -> str:
+    try:
+        source = inspect.getsource(obj)
+    except (OSError, TypeError):
+        source = ""
+    return hashlib.sha256(source.encode()).hexdigest()
+
+
+def _loader_key(load: Callable) -> str:
+    """Identifies the loader by its name and source, a lambda by the source of its line (e.g. calc_lean vs calc_all)"""
+    load = getattr(load, "func", load)
+    name = getattr(load, "__qualname__", type(load).__qualname__)
+    return f"{name}:{_source_digest(load)}"
+
+
+def _function_key(func: Callable) -> str:
+    """The qualified name of the function and the source of its module
+
+    The whole module is hashed, so that editing the helpers a function delegates to
+    (e.g. `embodied_flows` behind `ptt_matrix`) invalidates its results as well.
+    """
+    module = inspect.getmodule(func)
+    digest = _source_digest(module if module is not None else func)
+    return f"{func.__module__}.{func.__qualname__}:{digest}"
+
+
+class ResultCache:
+    """Persistent memoization of share function results for one dataset
+
+    Results are pickled to `directory`, keyed by a content hash of the dataset files, the
+    loader, the module of the function and its arguments.
+    Changes in other modules are not detected, bump `version` after them. The least recently used results
+    are evicted once the cache grows beyond `max_bytes`.
+    The dataset is only loaded on the first miss, so a fully cached run never parses it.
+
+    Usage:
+        results = ResultCache("data/2017", load=lambda: pymrio.parse_eora26(...).calc_all())
+        shares = results(co2_shares, eu_codes, south_codes)
+    """
+
+    def __init__(
+        self,
+        path: str,
+        load: Callable[[], Any],
+        directory: str | None = None,
+        max_bytes: int = MAX_BYTES,
+        version: str = "",
+    ) -> None:
+        """
+        Parameters:
+            path (str): The dataset directory (or file), its content is part of every key
+            load (Callable[[], Any]): Loads the dataset, e.g. parses and calculates the pymrio Eora
+            directory (str | None): Where results are stored, defaults to `path/.results_cache`
+            max_bytes (int): The size the cache is trimmed to after every write
+            version (str): Part of every key, change it to invalidate results computed with older code
+        """
+        self.path = path
+        self.directory = directory or os.path.join(
+            path if os.path.isdir(path) else os.path.dirname(path), CACHE_DIR
+        )
+        self.max_bytes = max_bytes
+        self._load = load
+        self._load_key = _loader_key(load)
+        self.version = version
+        self._eora = None
+        self._dataset_digest = None
+
+    @property
+    def eora(self) -> Any:
+        if self._eora is None:
+            self._eora = self._load()
+        return self._eora
+
+    @property
+    def dataset_digest(self) -> str:
+        if self._dataset_digest is None:
+            self._dataset_digest = self._digest_dataset()
+        return self._dataset_digest
+
+    def __call__(self, func: Callable, *args, **kwargs) -> Any:
+        """Returns func(eora, *args, **kwargs), from the cache if it was computed before"""
+        key = json.dumps(
+            [
+                self.dataset_digest,
+                self._load_key,
+                self.version,
+                _function_key(func),
+                [_normalize(arg) for arg in args],
+                # the order of the keyword arguments does not matter
+                _normalize(dict(sorted(kwargs.items()))),
+            ]
+        )
+        result_path = os.path.join(
+            self.directory, hashlib.sha256(key.encode()).hexdigest() + ".pkl"
+        )
+        if os.path.exists(result_path):
+            # the mtime marks the last use for the eviction
+            os.utime(result_path)
+            return pd.read_pickle(result_path)
+
+        result = func(self.eora, *args, **kwargs)
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = result_path + f".{os.getpid()}.tmp"
+        pd.to_pickle(result, tmp_path)
+        os.replace(tmp_path, result_path)
+        self._evict()
+        return result
+
+    def _dataset_files(self) -> list[str]:
+        if not os.path.isdir(self.path):
+            return [self.path]
+        files = []
+        for root, dirs, names in os.walk(self.path):
+            # skips the caches stored next to the data
+            dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+            files.extend(os.path.join(root, name) for name in sorted(names))
+        return files
+
+    def _digest_dataset(self) -> str:
+        digests_path = os.path.join(self.directory, DIGESTS)
+        known = {}
+        if os.path.exists(digests_path):
+            with open(digests_path) as f:
+                known = json.load(f)
+
+        digest = hashlib.sha256()
+        current = {}
+        for file in self._dataset_files():
+            stat = os.stat(file)
+            signature = [stat.st_mtime_ns, stat.st_size]
+            entry = known.get(file)
+            if entry is None or entry["signature"] != signature:
+                entry = {"signature": signature, "digest": _file_digest(file)}
+            current[file] = entry
+            digest.update(os.path.relpath(file, self.path).encode())
+            digest.update(entry["digest"].encode())
+
+        if current != known:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = digests_path + f".{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(current, f)
+            os.replace(tmp_path, digests_path)
+        return digest.hexdigest()
+
+    def _evict(self) -> None:
+        """Removes the least recently used results until the cache fits into max_bytes"""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".pkl"):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime_ns, stat.st_size, name))
+        size = sum(entry[1] for entry in entries)
+        for _, entry_size, name in sorted(entries):
+            if size <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.directory, name))
+            size -= entry_size
+
+
+def _file_digest(file: str) -> str:
+    digest = hashlib.sha256()
+    with open(file, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
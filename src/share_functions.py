@@ -1,22 +1,65 @@
+import numpy as np
 import pandas as pd
+import pymrio
+from typing import Iterable
+from src.mrio_adapter import as_mrio
 
 
-def embodied_co2_emissions(
+# the extension rows the share functions read, see `calc_lean`
+SHARE_INDICATORS = {
+    "Q": ["I-GHG-CO2 emissions"],
+    "VA": [("Primary input", "Compensation of employees D.1")],
+}
+
+
+def calc_lean(eora, indicators: dict[str, list] = SHARE_INDICATORS):
+    """
+    Lean alternative to pymrio's calc_all for the share functions.
+
+    Calculates x, A and L, but of the extensions only keeps the indicator rows of F and F_Y
+    and calculates their S, instead of all accounts (M, D_cba, D_pba, ...) for every satellite.
+
+    Parameters:
+        eora: The parsed pymrio Eora
+        indicators (dict[str, list]): The rows to keep per extension, first level labels or full row labels
+    """
+    eora.calc_system()
+    for name, rows in indicators.items():
+        extension = getattr(eora, name)
+        extension.F = extension.F.loc[rows]
+        if extension.F_Y is not None:
+            extension.F_Y = extension.F_Y.loc[rows]
+        extension.S = pymrio.calc_S(extension.F, eora.x)
+    return eora
+
+
+def _induced_output(
     eora, from_codes: list[str] | str, to_codes: list[str]
 ) -> pd.Series:
-    north_demand_from_south = eora.Y.loc[to_codes, from_codes].sum(axis=1)
-    north_demand_from_north = eora.Y.loc[from_codes, from_codes].sum(axis=1)
-
-    induced_demand_from_final_demand = eora.L.loc[to_codes, to_codes].dot(
-        north_demand_from_south
+    """
+    Output of the to_codes induced by the final demand of the from_codes for products of the
+    to_codes and of the from_codes themselves, L_ss y_s + L_sf y_f, as one solve with L.
+    """
+    sectors = eora.sectors
+    regions = sectors.get_level_values(0)
+    demand_regions = eora.Y.columns.get_level_values(0)
+    demand = (
+        eora.Y.reindex(sectors)
+        .to_numpy()[:, demand_regions.isin(_as_list(from_codes))]
+        .sum(axis=1)
     )
-    induced_demand_from_intermediate_demand = eora.L.loc[to_codes, from_codes].dot(
-        north_demand_from_north
+    induced = eora.solve(
+        demand * regions.isin(to_codes) + demand * regions.isin(_as_list(from_codes))
     )
+    return pd.Series(induced, index=sectors).loc[to_codes]
 
-    induced_demand = (
-        induced_demand_from_final_demand + induced_demand_from_intermediate_demand
-    )
+
+def embodied_co2_emissions(
+    eora, from_codes: list[str] | str, to_codes: list[str]
+) -> pd.Series:
+    eora = as_mrio(eora)
+    to_codes = _as_list(to_codes)
+    induced_demand = _induced_output(eora, from_codes, to_codes)
 
     f_shares = eora.Q.S.loc["I-GHG-CO2 emissions", to_codes]
 
@@ -30,32 +73,53 @@ def embodied_value_added(
     to_codes: list[str] | str,
     primary_input_label: str = "Compensation of employees D.1",
 ) -> pd.Series:
-    north_demand_from_south = eora.Y.loc[to_codes, from_codes].sum(axis=1)
-    north_demand_from_north = eora.Y.loc[from_codes, from_codes].sum(axis=1)
-
-    induced_demand_from_final_demand = eora.L.loc[to_codes, to_codes].dot(
-        north_demand_from_south
-    )
-    induced_demand_from_intermediate_demand = eora.L.loc[to_codes, from_codes].dot(
-        north_demand_from_north
-    )
-
-    induced_demand = (
-        induced_demand_from_final_demand + induced_demand_from_intermediate_demand
-    )
+    eora = as_mrio(eora)
+    to_codes = _as_list(to_codes)
+    induced_demand = _induced_output(eora, from_codes, to_codes)
     f_shares = eora.VA.S.loc[("Primary input", primary_input_label), to_codes]
 
     eva = f_shares.mul(induced_demand)
     return eva
 
 
+def sub_system_output(
+    eora, from_codes: list[str] | str, to_codes: list[str] | str
+) -> pd.Series:
+    """
+    Output of the to_codes induced by the final and intermediate demand of the from_codes,
+    solved within the sub system of the to_codes: (I - A_ss)^-1 (y_(n->s) + z_(n->s)).
+    """
+    eora = as_mrio(eora)
+    demand = (
+        eora.Y.loc[to_codes, from_codes].sum(axis=1)
+        + eora.block(to_codes, from_codes, "Z").sum(axis=1)
+    )
+    solver = eora.sub_solver(to_codes)
+    return pd.Series(solver.solve(demand.values), index=demand.index)
+
+
 def dependency_shares(
     eora,
     from_codes: list[str] | str,
     to_codes: list[str] | str,
     primary_input_label: str = "Compensation of employees D.1",
+    leontief: str = "global",
 ) -> pd.Series:
-    eva = embodied_value_added(eora, from_codes, to_codes, primary_input_label)
+    """
+    Share of the value added of the to_codes that depends on demand from the from_codes.
+
+    Parameters:
+        leontief (str): "global" projects the global Leontief inverse onto the to_codes,
+                        "sub" uses the Leontief inverse of the sub system (I - A_ss)^-1 (see claudius.typ)
+    """
+    eora = as_mrio(eora)
+    if leontief == "global":
+        eva = embodied_value_added(eora, from_codes, to_codes, primary_input_label)
+    elif leontief == "sub":
+        f_shares = eora.VA.S.loc[("Primary input", primary_input_label), to_codes]
+        eva = f_shares.mul(sub_system_output(eora, from_codes, to_codes))
+    else:
+        raise ValueError(f"Unknown Leontief definition {leontief}, use 'global' or 'sub'")
     total_value_added = eora.VA.F.loc[
         ("Primary input", primary_input_label), to_codes
     ].sum()
@@ -65,12 +129,67 @@ def dependency_shares(
 
 def co2_shares(
     eora, from_codes: list[str] | str, to_codes: list[str] | str
-) -> pd.Series:
+) -> pd.DataFrame:
+    """
+    Embodied CO2 emissions of the to_codes as a share of their total emissions.
+
+    Returns:
+        pd.DataFrame: The shares per emission compartment, compartments × sectors.
+    """
+    eora = as_mrio(eora)
     total_south_emissions = eora.Q.F.loc["I-GHG-CO2 emissions", to_codes].sum().sum()
     return embodied_co2_emissions(eora, from_codes, to_codes).div(total_south_emissions)
 
 
+def co2_share_variants(
+    eora,
+    from_codes: list[str] | str,
+    to_codes: list[str] | str,
+    exclusions: dict[str, Iterable[str]],
+) -> pd.DataFrame:
+    """
+    `co2_shares` with named sets of countries left out of the to_codes, all variants from one pass.
+
+    Parameters:
+        exclusions (dict[str, Iterable[str]]): Named sets of countries to leave out of the to_codes.
+
+    Returns:
+        pd.DataFrame: Sectors of the to_codes × variants, summed over the compartments,
+                      NaN for the sectors a variant leaves out.
+    """
+    eora = as_mrio(eora)
+    from_codes, to_codes = _as_list(from_codes), _as_list(to_codes)
+    sectors = eora.sectors
+    regions = sectors.get_level_values(0)
+    demand_regions = eora.Y.columns.get_level_values(0)
+    from_demand = (
+        eora.Y.reindex(sectors).to_numpy()[:, demand_regions.isin(from_codes)].sum(axis=1)
+    )
+
+    # the induced output is linear in the demand, so it is computed once per to country
+    # (its products demanded by the from_codes) plus once for the products of the from_codes
+    # and every variant sums the columns of its countries
+    columns = np.column_stack(
+        [regions == code for code in to_codes] + [regions.isin(from_codes)]
+    )
+    induced = eora.solve(from_demand[:, None] * columns)
+    emissions = _co2_intensity(eora, sectors)
+    total = eora.Q.F.loc["I-GHG-CO2 emissions"].sum(axis=0).reindex(sectors).to_numpy()
+
+    in_to = regions.isin(to_codes)
+    res = {}
+    for name, excluded in exclusions.items():
+        excluded = set(excluded)
+        kept = np.array([code not in excluded for code in to_codes] + [True])
+        rows = in_to & ~regions.isin(list(excluded))
+        res[name] = np.where(rows, emissions * induced[:, kept].sum(axis=1), np.nan) / (
+            total[rows].sum()
+        )
+    return pd.DataFrame(res, index=sectors)[in_to]
+
+
 def co2_shares_sectoral(eora, from_codes: list[str], to_codes: list[str]) -> pd.Series:
+    eora = as_mrio(eora)
     sectoral_emissions = eora.Q.F.loc["I-GHG-CO2 emissions", to_codes].sum()
 
     return (
@@ -79,28 +198,151 @@ def co2_shares_sectoral(eora, from_codes: list[str], to_codes: list[str]) -> pd.
 
 
 def co2_total(
-    eora, from_codes: list[str] | str, to_codes: list[str] | str
-) -> pd.Series:
-    emissions = {}
-    indices: pd.MultiIndex = eora.A.index[
-        eora.A.index._get_level_values(0).isin(from_codes)
-    ]
-
-    f_shares = eora.Q.S.loc["I-GHG-CO2 emissions"]
-    for sec in from_codes:
-        Y_total = eora.Y.loc[:, sec].sum(axis=1)
-
-        co2_total = f_shares.mul(eora.L.dot(Y_total)).sum().sum()
-        co2_south = (
-            f_shares[to_codes].mul(eora.L.loc[to_codes, :].dot(Y_total)).sum().sum()
-        )
-        emissions[(sec, "Final Demand")] = co2_south / co2_total
+    eora,
+    from_codes: list[str] | str,
+    to_codes: list[str] | str,
+    exclusions: dict[str, Iterable[str]] | None = None,
+) -> pd.Series | pd.DataFrame:
+    """
+    Share of the CO2 induced by the final demand of each from country that is emitted in the to_codes.
+
+    The final demand of all from countries is stacked into one block, so the emissions
+    of every from country follow from a single product with L.
+
+    Parameters:
+        exclusions (dict[str, Iterable[str]] | None): Named sets of countries to leave out of the to_codes.
+                        If given, one column per variant is returned, all masked from the same product.
+    """
+    eora = as_mrio(eora)
+    from_codes = _as_list(from_codes)
+    sectors = eora.sectors
+    demand_regions = eora.Y.columns.get_level_values(0)
+    y_stack = eora.Y.reindex(sectors).to_numpy() @ np.column_stack(
+        [demand_regions == code for code in from_codes]
+    )
+
+    emissions = _co2_intensity(eora, sectors)[:, None] * eora.solve(y_stack)
+    regions = sectors.get_level_values(0)
+    in_to = regions.isin(_as_list(to_codes))
+    variants = {
+        name: emissions[in_to & ~regions.isin(list(excluded))].sum(axis=0)
+        / emissions.sum(axis=0)
+        for name, excluded in (exclusions or {None: []}).items()
+    }
+
+    index = pd.MultiIndex.from_tuples(
+        [(code, "Final Demand") for code in from_codes], names=["Region", "Sector"]
+    )
+    if exclusions is None:
+        return pd.Series(variants[None], index=index)
+    return pd.DataFrame(variants, index=index)
+
+
+def _as_list(codes: Iterable[str] | str) -> list[str]:
+    return [codes] if isinstance(codes, str) else list(codes)
 
-    res = pd.Series(emissions)
-    res.index.names = ["Region", "Sector"]
+
+def _co2_intensity(eora, sectors: pd.Index) -> np.ndarray:
+    """CO2 emissions per unit of output, summed over the compartments"""
+    return eora.Q.S.loc["I-GHG-CO2 emissions"].sum(axis=0).reindex(sectors).to_numpy()
+
+
+def _as_groups(targets: Iterable[str] | dict[str, list[str]]) -> dict[str, list[str]]:
+    """A list of countries is turned into one group per country"""
+    if isinstance(targets, dict):
+        return {name: list(codes) for name, codes in targets.items()}
+    return {code: [code] for code in targets}
+
+
+def embodied_flows(
+    eora,
+    from_codes: list[str] | str,
+    targets: Iterable[str] | dict[str, list[str]],
+    primary_input_label: str = "Compensation of employees D.1",
+) -> pd.DataFrame:
+    """
+    Embodied CO2 and value added between from_codes and each of the targets in one pass.
+
+    The demand of the from_codes for every target and of every target for the from_codes is
+    stacked into one (n, 2k) block, so a single product with L replaces the 4k products
+    of calling `ptt`, `co2_shares` and `dependency_shares` per target.
+
+    Parameters:
+        eora: The pymrio Eora (with L, Y, Q and VA calculated) or a `src.eora.Eora`
+        from_codes (list[str] | str): The demanding countries
+        targets (Iterable[str] | dict[str, list[str]]): Target countries, or named groups of countries
+
+    Returns:
+        pd.DataFrame: Per target the embodied CO2 and value added (from_codes -> target),
+                      the CO2 and dependency shares and the PTT ratio
+    """
+    eora = as_mrio(eora)
+    from_codes = _as_list(from_codes)
+    targets = _as_groups(targets)
+    sectors = eora.sectors
+    regions = sectors.get_level_values(0)
+    demand_regions = eora.Y.columns.get_level_values(0)
+
+    in_from = regions.isin(from_codes)
+    in_target = np.column_stack([regions.isin(codes) for codes in targets.values()])
+    target_demand = np.column_stack(
+        [demand_regions.isin(codes) for codes in targets.values()]
+    )
+
+    y = eora.Y.reindex(sectors).to_numpy()
+    from_demand = y[:, demand_regions.isin(from_codes)].sum(axis=1)[:, None]
+    to_demand = y @ target_demand
+    # as in embodied_co2_emissions: the demand for products of the target plus the demand
+    # for products of the demanding countries themselves
+    forward = from_demand * in_target + from_demand * in_from[:, None]
+    backward = to_demand * in_from[:, None] + to_demand * in_target
+    induced = eora.solve(np.hstack([forward, backward]))
+    k = len(targets)
+    forward = induced[:, :k] * in_target
+    backward = induced[:, k:] * in_from[:, None]
+
+    co2 = _co2_intensity(eora, sectors)
+    co2_total = eora.Q.F.loc["I-GHG-CO2 emissions"].sum(axis=0).reindex(sectors).to_numpy()
+    va_label = ("Primary input", primary_input_label)
+    va = eora.VA.S.loc[va_label].reindex(sectors).to_numpy()
+    va_total = eora.VA.F.loc[va_label].reindex(sectors).to_numpy()
+
+    res = pd.DataFrame(
+        {
+            "co2": co2 @ forward,
+            "value_added": va @ forward,
+            "co2_share": (co2 @ forward) / (co2_total @ in_target),
+            "dependency_share": (va @ forward) / (va_total @ in_target),
+            "ptt": ((co2 @ forward) / (va @ forward)) / ((co2 @ backward) / (va @ backward)),
+        },
+        index=pd.Index(list(targets), name="Region"),
+    )
     return res
 
 
+def ptt_matrix(
+    eora,
+    from_codes: list[str] | dict[str, list[str]],
+    to_codes_list: Iterable[str] | dict[str, list[str]],
+) -> pd.DataFrame:
+    """
+    PTT ratios of every from group with every target, one `embodied_flows` pass per from group.
+
+    Parameters:
+        from_codes (list[str] | dict[str, list[str]]): A group of countries, or named groups
+        to_codes_list (Iterable[str] | dict[str, list[str]]): Target countries, or named groups of countries
+
+    Returns:
+        pd.DataFrame: The PTT ratios, from groups × targets. A single group is named "from".
+    """
+    eora = as_mrio(eora)
+    groups = from_codes if isinstance(from_codes, dict) else {"from": from_codes}
+    targets = _as_groups(to_codes_list)
+    return pd.DataFrame(
+        {name: embodied_flows(eora, codes, targets)["ptt"] for name, codes in groups.items()}
+    ).T
+
+
 def ptt(eora, from_codes: list[str] | str, to_codes: list[str] | str) -> pd.DataFrame:
     """
     Calculates the ratio of embodied CO2 emissions to embodied value added
@@ -109,13 +351,4 @@ def ptt(eora, from_codes: list[str] | str, to_codes: list[str] | str) -> pd.Data
     if eora is None:
         print("Eora data not loaded. Skipping PTT calculation.")
         return {}
-    ft = (
-        embodied_co2_emissions(eora, from_codes, to_codes).sum().sum()
-        / embodied_value_added(eora, from_codes, to_codes).sum()
-    )
-    tf = (
-        embodied_co2_emissions(eora, to_codes, from_codes).sum().sum()
-        / embodied_value_added(eora, to_codes, from_codes).sum()
-    )
-
-    return ft / tf
+    return embodied_flows(eora, from_codes, {"to": _as_list(to_codes)})["ptt"].iloc[0]
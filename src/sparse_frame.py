@@ -0,0 +1,58 @@
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+@dataclass
+class SparseFrame:
+    """A scipy CSR matrix labelled like a DataFrame
+
+    Only implements the parts of the DataFrame API that Eora needs for T and A.
+
+    Attributes:
+        values (sparse.csr_array): The matrix
+        index (pd.Index): The row labels
+        columns (pd.Index): The column labels
+    """
+
+    values: sparse.csr_array
+    index: pd.Index
+    columns: pd.Index
+
+    @classmethod
+    def from_dense(cls, frame: pd.DataFrame, chunk_size: int = 1024) -> "SparseFrame":
+        """Converts a (possibly memory mapped) DataFrame in row chunks, so it is never copied densely"""
+        values = frame.values
+        chunks = [
+            sparse.csr_array(np.asarray(values[start : start + chunk_size]))
+            for start in range(0, values.shape[0], chunk_size)
+        ]
+        return cls(sparse.vstack(chunks, format="csr"), frame.index, frame.columns)
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.values.shape
+
+    @property
+    def nnz(self) -> int:
+        return self.values.nnz
+
+    def sum(self, axis: int = 0) -> pd.Series:
+        if axis == 0:
+            return pd.Series(self.values.sum(axis=0), index=self.columns)
+        return pd.Series(self.values.sum(axis=1), index=self.index)
+
+    def divide(self, other: pd.Series, axis: int = 1) -> "SparseFrame":
+        """Divides the columns (axis=1) or rows (axis=0) by `other`, entries divided by zero stay zero"""
+        labels = self.columns if axis == 1 else self.index
+        divisor = other.reindex(labels).to_numpy(dtype=float)
+        scale = np.divide(1.0, divisor, out=np.zeros_like(divisor), where=divisor != 0)
+        if axis == 1:
+            values = self.values @ sparse.diags_array(scale)
+        else:
+            values = sparse.diags_array(scale) @ self.values
+        return SparseFrame(sparse.csr_array(values), self.index, self.columns)
+
+    def to_dense(self) -> pd.DataFrame:
+        return pd.DataFrame(self.values.toarray(), index=self.index, columns=self.columns)
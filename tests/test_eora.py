@@ -1,41 +1,558 @@
 import src.eora as eo
+from src import eora_cache, csv_reader
 from copy import deepcopy
+import os
+import re
+import tempfile
+import numpy as np
+import pandas as pd
 import unittest
+from unittest import mock
+
+
+def write_toy_eora(path: str, seed: int = 0) -> None:
+    """Writes a toy Eora with 3 countries × 3 sectors in the downloaded csv layout."""
+    rng = np.random.default_rng(seed)
+    countries = ["USA", "CHN", "DEU"]
+    sectors = ["Agriculture", "Fishing", "Mining"]
+
+    index_t = pd.DataFrame(
+        [(c, "Industries", s) for c in countries for s in sectors],
+        columns=["CountryA3", "Entity", "Sector"],
+    )
+    index_y = pd.DataFrame(
+        [(c, "Final Demand", "Household final consumption P.3h") for c in countries],
+        columns=["CountryA3", "Entity", "Sector"],
+    )
+    index_v = pd.DataFrame(
+        [
+            ("TOT", "Primary input", "Compensation of employees D.1"),
+            ("TOT", "Primary input", "Operating surplus, gross B.2g"),
+        ],
+        columns=["CountryA3", "Entity", "Sector"],
+    )
+    index_q = pd.DataFrame(
+        [("I-GHG-CO2 emissions", "Total"), ("I-GHG-CH4 emissions", "Total")],
+        columns=["IndicatorCode", "LineItems"],
+    )
+    n, n_y = len(index_t), len(index_y)
+
+    for name, index in [
+        ("index_t.csv", index_t),
+        ("index_y.csv", index_y),
+        ("index_v.csv", index_v),
+        ("index_q.csv", index_q),
+    ]:
+        index.insert(0, "Sequence", range(1, len(index) + 1))
+        index.to_csv(os.path.join(path, name), index=False)
+
+    for name, shape in [
+        ("T.csv", (n, n)),
+        ("Y.csv", (n, n_y)),
+        ("V.csv", (len(index_v), n)),
+        ("Q.csv", (len(index_q), n + n_y)),
+    ]:
+        pd.DataFrame(rng.uniform(1, 100, size=shape)).to_csv(
+            os.path.join(path, name), header=False, index=False
+        )
 
 
 class TestEora(unittest.TestCase):
+    @staticmethod
+    def split_back(eora_orig: eo.Eora, sectors: list[tuple]) -> eo.DisaggregatesInto:
+        return [
+            (
+                sector,
+                eo.SectorData(
+                    t_rows=eora_orig.t.loc[sector],
+                    t_columns=eora_orig.t[sector],
+                    x=eora_orig.x[sector],
+                    y=eora_orig.y.loc[sector],
+                    v=eora_orig.v[sector],
+                    q=eora_orig.q.f[sector],
+                ),
+            )
+            for sector in sectors
+        ]
+
+    @unittest.skipUnless(os.path.isdir("data/full_eora"), "full Eora not available")
     def test_disaggregate(self):
-        eora = eo.Eora("data/full_eora")
+        eora_orig = eo.Eora("data/full_eora")
+        sectors = [
+            ("AFG", "Industries", "Fishing"),
+            ("AFG", "Industries", "Agriculture"),
+        ]
+
+        eora = eora_orig.aggregated(
+            {sector: ("test", "test", "test") for sector in sectors}
+        ).dissaggregated(("test", "test", "test"), self.split_back(eora_orig, sectors))
+
+        t = eora.t.loc[eora_orig.t.index, eora_orig.t.columns]
+        np.testing.assert_allclose(t.values, eora_orig.t.values)
+
+    @mock.patch.object(eo, "MAX_UPDATE_SHARE", 1.0)
+    def test_disaggregate_toy(self):
+        eora = eo.test_eora()
+        eora_orig = deepcopy(eora)
+        sectors = [("USA", "Industry", "S2"), ("CHN", "Industry", "S1")]
+
+        eora.aggregate(sectors, ("test", "test", "test"))
+        eora.dissaggregate(("test", "test", "test"), self.split_back(eora_orig, sectors))
+
+        index = eora_orig.t.index
+        self.assertEqual(eora.solver.depth, 2)
+        self.assertEqual(list(eora.t.index[-2:]), sectors)
+        np.testing.assert_allclose(eora.t.loc[index, index].values, eora_orig.t.values)
+        np.testing.assert_allclose(eora.y.loc[index].values, eora_orig.y.values)
+        np.testing.assert_allclose(eora.q.f[index].values, eora_orig.q.f.values)
+        np.testing.assert_allclose(eora.l.loc[index, index].values, eora_orig.l.values)
+
+    @mock.patch.object(eo, "MAX_UPDATE_SHARE", 1.0)
+    def test_disaggregate_keeps_removed_name(self):
+        eora = eo.test_eora()
         eora_orig = deepcopy(eora)
+        eora.l = None
+        self.assertEqual(eora.solver.depth, 0)
+        sectors = [("USA", "Industry", "S1"), ("CHN", "Industry", "S1")]
+
+        eora.aggregate(sectors, sectors[0])
+        # the first part has the label of the sector it replaces
+        eora.dissaggregate(sectors[0], self.split_back(eora_orig, sectors))
+
+        self.assertEqual(eora.solver.depth, 2)
+        index = eora_orig.t.index
+        l = np.linalg.inv(np.eye(eora.a.shape[0]) - eora.a.values)
+        np.testing.assert_allclose(eora.solve(eora.y.values), l @ eora.y.values)
+        np.testing.assert_allclose(eora.l.loc[index, index].values, eora_orig.l.values)
+
+    def test_disaggregate_rejects_kept_names(self):
+        eora = eo.test_eora()
+        sectors = [("USA", "Industry", "S1"), ("CHN", "Industry", "S1")]
+        # the second part would collide with a sector that is kept
+        with self.assertRaises(ValueError):
+            eora.dissaggregate(sectors[0], self.split_back(eora, sectors))
+        self.assertEqual(len(eora.sectors), len(eo.test_eora().sectors))
+
+    def test_snapshots(self):
+        eora = eo.test_eora()
+        eora.l = None
+        solver = eora.solver
+        t, y = eora.t, eora.y
+        sectors = [("USA", "Industry", "S2"), ("CHN", "Industry", "S1")]
 
+        with mock.patch.object(eo, "MAX_UPDATE_SHARE", 1.0):
+            aggregated = eora.aggregated({sector: ("AGG", "Industry", "S") for sector in sectors})
+        self.assertIs(eora.t, t)
+        self.assertIs(eora.y, y)
+        self.assertEqual(eora.x.shape, (9,))
+        self.assertIs(aggregated.q.f_y, eora.q.f_y)
+        self.assertIsNot(aggregated.q, eora.q)
+
+        # the snapshot builds on the parent's factorization and only builds T when asked
+        self.assertIs(aggregated.solver._base, solver)
+        self.assertIsNone(aggregated._t)
+        expected = deepcopy(eora)
+        expected.aggregate(sectors, ("AGG", "Industry", "S"))
+        np.testing.assert_allclose(
+            aggregated.solve(aggregated.y.values), expected.l.values @ expected.y.values
+        )
+        self.assertIsNone(aggregated._t)
+        pd.testing.assert_frame_equal(aggregated.t, expected.t)
+
+    def test_binary_cache(self):
+        with tempfile.TemporaryDirectory() as path:
+            write_toy_eora(path)
+            from_csv = eo.Eora(path)
+            self.assertTrue(eora_cache.is_valid(path, eo.SOURCE_FILES))
+
+            from_cache = eo.Eora(path)
+            pd.testing.assert_frame_equal(from_csv.t, from_cache.t)
+            pd.testing.assert_frame_equal(from_csv.y, from_cache.y)
+            pd.testing.assert_frame_equal(from_csv.v, from_cache.v)
+            pd.testing.assert_frame_equal(from_csv.q.f, from_cache.q.f)
+            pd.testing.assert_frame_equal(from_csv.q.f_y, from_cache.q.f_y)
+
+            write_toy_eora(path, seed=1)
+            stat = os.stat(os.path.join(path, "T.csv"))
+            os.utime(os.path.join(path, "T.csv"), ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+            self.assertFalse(eora_cache.is_valid(path, eo.SOURCE_FILES))
+            reloaded = eo.Eora(path)
+            self.assertFalse(np.allclose(reloaded.t.values, from_csv.t.values))
+
+    def test_streaming_reader(self):
+        with tempfile.TemporaryDirectory() as path:
+            write_toy_eora(path)
+            t = pd.read_csv(os.path.join(path, "T.csv"), header=None).to_numpy()
+
+            with mock.patch.object(csv_reader, "CHUNK_ROWS", 2):
+                for pa_csv in [csv_reader.pa_csv, None]:
+                    with mock.patch.object(csv_reader, "pa_csv", pa_csv):
+                        np.testing.assert_allclose(
+                            csv_reader.read_matrix(os.path.join(path, "T.csv"), t.shape), t
+                        )
+            with self.assertRaises(ValueError):
+                csv_reader.read_matrix(os.path.join(path, "T.csv"), (t.shape[0] + 1, t.shape[1]))
+
+            with mock.patch.object(
+                eo.Eora, "_read_index", side_effect=eo.Eora._read_index
+            ) as read_index:
+                double = eo.Eora(path)
+            # each of the four index files is parsed exactly once
+            self.assertEqual(read_index.call_count, 4)
+            self.assertIs(double.t.index, double.y.index)
+            single = eo.Eora(path, dtype=np.float32)
+            self.assertEqual(single.t.values.dtype, np.float32)
+            self.assertEqual(single.q.f_y.values.dtype, np.float32)
+            self.assertTrue(eora_cache.is_valid(path, eo.SOURCE_FILES, "float32"))
+            pd.testing.assert_frame_equal(single.q.f, double.q.f, check_dtype=False, rtol=1e-6)
+            np.testing.assert_allclose(
+                single.leontief_apply(single.y).values,
+                double.leontief_apply(double.y).values,
+                rtol=1e-5,
+            )
+
+    def test_float32_tables_stay_float32(self):
+        sectors = [("USA", "Industries", "Mining"), ("CHN", "Industries", "Mining")]
+        with tempfile.TemporaryDirectory() as path:
+            write_toy_eora(path)
+            eora_orig = eo.Eora(path, cache=False, dtype=np.float32)
+            for sparse in [False, True]:
+                eora = eo.Eora(path, cache=False, sparse=sparse, dtype=np.float32)
+                eora.aggregate(sectors, ("AGG", "Industries", "Mining"))
+                eora.dissaggregate(
+                    ("AGG", "Industries", "Mining"), self.split_back(eora_orig, sectors)
+                )
+                for frame in [eora.t, eora.y, eora.v, eora.x, eora.q.f]:
+                    self.assertEqual(frame.values.dtype, np.float32)
+                index = eora_orig.sectors
+                np.testing.assert_allclose(
+                    eora.y.loc[index].values, eora_orig.y.values, rtol=1e-6
+                )
+
+    def test_index_codes(self):
+        eora = eo.test_eora()
+        codes = eora.codes
+        self.assertEqual(list(codes.countries), ["USA", "CHN", "DEU"])
+        np.testing.assert_array_equal(codes.country, np.repeat([0, 1, 2], 3))
+        np.testing.assert_array_equal(codes.sector, np.tile([0, 1, 2], 3))
+        np.testing.assert_array_equal(eora.country_positions(["DEU", "USA"]), [6, 7, 8, 0, 1, 2])
+        self.assertEqual(codes.country_slice("CHN"), slice(3, 6))
+
+        sectors = [("DEU", "Industry", "S2"), ("USA", "Industry", "S3")]
+        positions = eora.sector_positions(sectors)
+        np.testing.assert_array_equal(
+            eora.t.values[np.ix_(positions, positions)], eora.t.loc[sectors, sectors].values
+        )
+        with self.assertRaises(KeyError):
+            eora.country_positions(["FRA"])
+
+        eora.aggregate_many({("USA", "Industry", "S1"): ("AGG", "Industry", "S1")})
+        self.assertIsNot(eora.codes, codes)
+        self.assertEqual(eora.codes.country_slice("AGG"), slice(8, 9))
+        self.assertEqual(eora.codes.country_slice("USA"), slice(0, 2))
+
+    def test_block(self):
+        eora = eo.test_eora()
+        l = eora.l
+        block = eora.block(["USA", "CHN"], "DEU")
+        pd.testing.assert_frame_equal(block, l.loc[["USA", "CHN"], ["DEU"]])
+        self.assertTrue(np.shares_memory(block.values, l.values))
+        self.assertIs(eora.block(["USA", "CHN"], ["DEU"]), block)
+
+        scattered = eora.block(["DEU", "USA"], ["CHN"], matrix="t")
+        pd.testing.assert_frame_equal(scattered, eora.t.loc[["DEU", "USA"], ["CHN"]])
+
+        with mock.patch.object(eo, "BLOCK_CACHE_SIZE", 1):
+            eora.block("USA", "USA")
+        self.assertEqual(len(eora._blocks), 1)
+        eora.l = None
+        self.assertIsNot(eora.block("USA", "USA"), eora.block("USA", "USA", matrix="a"))
+
+        # changing the tables releases the blocks of the replaced matrices
+        l = eora.l
+        eora.block("USA", "USA")
         eora.aggregate(
-            [("AFG", "Industries", "Agriculture"), ("AFG", "Industries", "Fishing")],
-            ("test", "test", "test"),
+            [("USA", "Industry", "S1"), ("CHN", "Industry", "S1")], ("AGG", "Industry", "S")
         )
+        self.assertFalse(any(source is l for source, _ in (eora._blocks or {}).values()))
+
+    def test_sub_leontief(self):
+        eora = eo.test_eora()
+        countries = ["DEU", "USA"]
+        a_ss = eora.a.loc[countries, countries].values
+        expected = np.linalg.inv(np.eye(len(a_ss)) - a_ss)
+
+        sub = eora.sub_leontief(countries)
+        np.testing.assert_allclose(sub.values, expected)
+        self.assertTrue(sub.index.equals(eora.a.loc[countries, countries].index))
+        # differs from the projection of the global inverse
+        self.assertFalse(np.allclose(sub.values, eora.l.loc[countries, countries].values))
+        self.assertIs(eora.sub_solver(["DEU", "USA"]), eora.sub_solver(countries))
 
-        sector_data = eo.SectorData(
-            t_rows=eora_orig.t[("AFG", "Industries", "Agriculture")],
-            t_columns=eora_orig.t.loc[("AFG", "Industries", "Agriculture")],
-            x=eora_orig.x[("AFG", "Industries", "Agriculture")],
-            y=eora_orig.y[("AFG", "Industries", "Agriculture")],
-            q_rows=eora_orig.q[("AFG", "Industries", "Agriculture")],
+    def test_mmap(self):
+        with tempfile.TemporaryDirectory() as path:
+            write_toy_eora(path)
+            in_memory = eo.Eora(path, cache=False)
+            mapped = eo.Eora(path, mmap=True)
+            np.testing.assert_allclose(mapped.l.values, in_memory.l.values)
+            self.assertIn("l", eora_cache.cached_frames(path))
+
+            for frame in [mapped.t, mapped.a, mapped.l]:
+                self.assertFalse(frame.values.flags.writeable)
+
+            remapped = eo.Eora(path, mmap=True)
+            pd.testing.assert_frame_equal(remapped.l, mapped.l)
+
+    def test_cached_a_and_l_read_on_access(self):
+        with tempfile.TemporaryDirectory() as path:
+            write_toy_eora(path)
+            mapped = eo.Eora(path, mmap=True)
+            mapped.l
+
+            plain = eo.Eora(path)
+            self.assertIsNone(plain._l)
+            lazy = eo.Eora(path, lazy=True)
+            self.assertIsNone(lazy._a)
+            self.assertIsNone(lazy._l)
+
+            pd.testing.assert_frame_equal(plain.l, mapped.l)
+            self.assertTrue(plain.l.values.flags.writeable)
+            self.assertIsNone(plain._solver)
+            pd.testing.assert_frame_equal(lazy.a, mapped.a)
+            self.assertFalse(lazy.a.values.flags.writeable)
+
+    def test_lazy(self):
+        with tempfile.TemporaryDirectory() as path:
+            write_toy_eora(path)
+            in_memory = eo.Eora(path, cache=False)
+            lazy = eo.Eora(path, lazy=True)
+            self.assertIsNone(lazy._a)
+            self.assertIsNone(lazy.q._a)
+            self.assertIn("x", eora_cache.cached_frames(path))
+            pd.testing.assert_series_equal(eo.Eora(path, lazy=True).x, in_memory.x)
+
+            mining = ("CHN", "Industries", "Mining")
+            usa = [("USA", "Industries", s) for s in ["Agriculture", "Fishing", "Mining"]]
+            pd.testing.assert_frame_equal(
+                lazy.select("t", "USA", ("CHN", slice(None), "Mining")),
+                in_memory.t.loc[usa, [mining]],
+            )
+            pd.testing.assert_frame_equal(
+                lazy.select("y", [mining]), in_memory.y.loc[[mining]]
+            )
+            co2 = ("I-GHG-CO2 emissions", "Total")
+            pd.testing.assert_frame_equal(
+                lazy.select("q", [co2], (["DEU", "USA"],)),
+                in_memory.q.f.loc[[co2], in_memory.sectors[[6, 7, 8, 0, 1, 2]]],
+            )
+            with self.assertRaises(KeyError):
+                lazy.select("t", [("FRA", "Industries", "Mining")])
+            self.assertIsNone(lazy._a)
+
+            np.testing.assert_allclose(lazy.l.values, in_memory.l.values)
+            self.assertIn("a", eora_cache.cached_frames(path))
+            self.assertFalse(lazy.a.values.flags.writeable)
+
+    @mock.patch.object(eo, "EV_PATTERNS", [r"\bfishing\b"])
+    @mock.patch.object(eo, "ICE_PATTERNS", [r"\bmining\b", r"^agri"])
+    @mock.patch.dict(eo.COUNTRY_TWEAKS, {"DEU": {"EV": [r"culture"]}})
+    def test_bundle_mask(self):
+        with tempfile.TemporaryDirectory() as path:
+            write_toy_eora(path)
+            eora = eo.Eora(path, cache=False)
+
+        def reference(iso, patterns):
+            return [
+                country == iso and any(re.search(p, eo._norm_text(name)) for p in patterns)
+                for country, _, name in eora.sectors
+            ]
+
+        for iso in ["USA", "DEU", "FRA"]:
+            ice, ev = eo._country_patterns(iso)
+            np.testing.assert_array_equal(eo.bundle_mask(eora, iso, "ICE"), reference(iso, ice))
+            np.testing.assert_array_equal(eo.bundle_mask(eora, iso, "ev"), reference(iso, ev))
+        self.assertEqual(eo.bundle_mask(eora, "DEU", "EV").sum(), 2)
+        self.assertIs(eo.bundle_mask(eora, "USA", "ICE"), eo.bundle_mask(eora, "USA", "ICE"))
+
+        eora.aggregate(
+            [("USA", "Industries", "Mining"), ("CHN", "Industries", "Mining")],
+            ("USA", "Industries", "Mining and quarrying"),
+        )
+        self.assertEqual(len(eo.bundle_mask(eora, "USA", "ICE")), len(eora.sectors))
+        self.assertEqual(eo.bundle_mask(eora, "USA", "ICE").sum(), 2)
+
+    @mock.patch.object(eo, "CHUNK_ROWS", 4)
+    @mock.patch.object(eo, "EV_PATTERNS", [r"\bfishing\b", r"\bmining\b"])
+    @mock.patch.object(eo, "ICE_PATTERNS", [r"\bmining\b", r"^agri"])
+    @mock.patch.dict(eo.COUNTRY_TWEAKS, {"DEU": {"EV": [r"culture"]}})
+    def test_bundle_statistics(self):
+        with tempfile.TemporaryDirectory() as path:
+            write_toy_eora(path)
+            eora = eo.Eora(path, cache=False)
+            sparse = eo.Eora(path, cache=False, sparse=True)
+
+        stats = eo.bundle_statistics(eora)
+        summary = stats["summary"]
+        for iso in ["USA", "CHN", "DEU"]:
+            pairs = eo.bundle_pairs_for_country(eora, iso)
+            for kind in ["ICE", "EV"]:
+                supply, demand = pairs[kind], eo.bundle_demand_stats(eora, iso, kind)
+                row = summary.loc[iso]
+                self.assertAlmostEqual(row[f"x_{kind}"], supply["x_bundle"])
+                self.assertAlmostEqual(row[f"va_{kind}"], supply["va_bundle"])
+                self.assertAlmostEqual(row[f"domestic_{kind}"], supply["domestic_sales"])
+                self.assertAlmostEqual(row[f"exports_{kind}"], supply["export_sales"])
+                self.assertAlmostEqual(row[f"inputs_total_{kind}"], demand["total_inputs"])
+                self.assertAlmostEqual(row[f"inputs_imports_{kind}"], demand["import_inputs"])
+
+                buyers = stats["sales"][kind].loc[iso].drop(iso)
+                pd.testing.assert_series_equal(
+                    buyers.nlargest(10), supply["top_foreign_buyers"], check_names=False
+                )
+                pd.testing.assert_series_equal(
+                    stats["a_intensity"][kind].loc[iso].sort_index(),
+                    supply["A_intensity_by_buyer_country"].sort_index(),
+                    check_names=False,
+                )
+                suppliers = stats["inputs"][kind][iso].groupby(level=0).sum()
+                pd.testing.assert_series_equal(
+                    suppliers.nlargest(15), demand["top_supplier_countries"], check_names=False
+                )
+            self.assertAlmostEqual(row["x_EV_to_ICE"], pairs["ratios"]["x_EV_to_ICE"])
+
+        pd.testing.assert_frame_equal(eo.bundle_statistics(sparse)["summary"], summary)
+
+    @mock.patch.object(eo, "EV_PATTERNS", [r"\bfishing\b", r"\bmining\b"])
+    @mock.patch.object(eo, "ICE_PATTERNS", [r"\bmining\b", r"^agri"])
+    def test_bundle_backward_linkages(self):
+        with tempfile.TemporaryDirectory() as path:
+            write_toy_eora(path)
+            eora = eo.Eora(path, cache=False)
+            sparse = eo.Eora(path, cache=False, sparse=True)
+        l = np.linalg.inv(np.eye(len(eora.sectors)) - eora.a.values)
+
+        mask = eo.bundle_mask(eora, "CHN", "EV")
+        requirements = eo.bundle_total_requirements(eora, "CHN", "EV")
+        np.testing.assert_allclose(requirements.values, l @ eora.a.values[:, mask])
+        self.assertTrue(requirements.columns.equals(eora.sectors[mask]))
+        self.assertEqual(eo.bundle_total_requirements(eora, "FRA").shape, (9, 0))
+
+        linkages = eo.bundle_backward_linkages(eora, "CHN", "EV")
+        total = l @ eora.t.values[:, mask].sum(axis=1)
+        self.assertAlmostEqual(linkages["total_inputs"], total.sum())
+        self.assertAlmostEqual(
+            linkages["direct_inputs"], eo.bundle_demand_stats(eora, "CHN", "EV")["total_inputs"]
         )
+        # the sectors of CHN are at positions 3 to 5
+        self.assertAlmostEqual(linkages["import_inputs"], total.sum() - total[3:6].sum())
+        self.assertGreater(linkages["total_inputs"], linkages["direct_inputs"])
+
+        totals = eo.bundle_total_inputs(eora)
+        np.testing.assert_allclose(totals["EV"]["CHN"].values, total)
+        sparse_linkages = eo.bundle_backward_linkages(sparse, "CHN", "EV")
+        self.assertAlmostEqual(sparse_linkages["total_inputs"], linkages["total_inputs"])
+        self.assertIsNone(eora._l)
+        self.assertIsNone(sparse._l)
+
+    def test_leontief_apply(self):
+        eora = eo.test_eora()
+        l = np.linalg.inv(np.eye(eora.a.shape[0]) - eora.a.values)
+        eora.l = None
+
+        np.testing.assert_allclose(eora.solve(eora.y.values), l @ eora.y.values)
+        self.assertIsNone(eora._l)
 
-        sector_data_2 = eo.SectorData(
-            t_rows=eora_orig.t[("AFG", "Industries", "Fishing")],
-            t_columns=eora_orig.t.loc[("AFG", "Industries", "Fishing")],
-            x=eora_orig.x[("AFG", "Industries", "Fishing")],
-            y=eora_orig.y[("AFG", "Industries", "Fishing")],
-            q_rows=eora_orig.q[("AFG", "Industries", "Fishing")],
+        demand = eora.y.sum(axis=1).iloc[::-1]
+        induced = eora.leontief_apply(demand)
+        self.assertTrue(induced.index.equals(eora.a.index))
+        np.testing.assert_allclose(induced.values, l @ eora.y.sum(axis=1).values)
+        np.testing.assert_allclose(eora.l.values, l)
+
+    def test_sparse(self):
+        with tempfile.TemporaryDirectory() as path:
+            write_toy_eora(path)
+            sparse = eo.Eora(path, sparse=True)
+            self.assertEqual(eora_cache.cached_frames(path)["t"], "sparse")
+            dense = eo.Eora(path)
+
+            np.testing.assert_allclose(sparse.t.values.toarray(), dense.t.values)
+            np.testing.assert_allclose(sparse.x.values, dense.x.values)
+            pd.testing.assert_frame_equal(
+                sparse.leontief_apply(sparse.y), dense.leontief_apply(dense.y)
+            )
+
+            # a memory mapped load rewrites the sparse T dense, to share it read-only
+            mapped = eo.Eora(path, mmap=True)
+            self.assertFalse(mapped.t.values.flags.writeable)
+            self.assertEqual(eora_cache.cached_frames(path)["t"], "dense")
+            self.assertFalse(os.path.exists(os.path.join(eora_cache.cache_dir(path), "t.npz")))
+            np.testing.assert_allclose(mapped.t.values, dense.t.values)
+            resparse = eo.Eora(path, sparse=True)
+            np.testing.assert_allclose(resparse.t.values.toarray(), dense.t.values)
+
+    @mock.patch.object(eo, "MAX_UPDATE_SHARE", 1.0)
+    def test_aggregate_updates_leontief(self):
+        eora = eo.test_eora()
+        eora.l = None
+        self.assertEqual(eora.solver.depth, 0)
+        sectors = [("USA", "Industry", "S1"), ("CHN", "Industry", "S2")]
+        eora.aggregate(sectors, ("AGG", "Industry", "S1"))
+        eora.aggregate(
+            [("DEU", "Industry", "S3"), ("AGG", "Industry", "S1")],
+            ("AGG", "Industry", "S2"),
         )
 
-        dis: eo.DisaggregatesInto = [
-            (("AFG", "Industries", "Fishing"), sector_data_2),
-            (("AFG", "Industries", "Agriculture"), sector_data),
-        ]
+        self.assertEqual(eora.solver.depth, 2)
+        self.assertEqual(eora.a.index[-1], ("AGG", "Industry", "S2"))
+        l = np.linalg.inv(np.eye(eora.a.shape[0]) - eora.a.values)
+        np.testing.assert_allclose(eora.solve(eora.y.values), l @ eora.y.values)
+        np.testing.assert_allclose(eora.l.values, l)
+        np.testing.assert_allclose(
+            eora.solver.solve_transposed(eora.q.a.values.T), l.T @ eora.q.a.values.T
+        )
+
+    def test_aggregate_reuses_removed_name(self):
+        # the group is not a kept sector, although it has the label of a merged one
+        for share, depth in [(eo.MAX_UPDATE_SHARE, 0), (1.0, 1)]:
+            eora = eo.test_eora()
+            eora.l = None
+            self.assertEqual(eora.solver.depth, 0)
+            with mock.patch.object(eo, "MAX_UPDATE_SHARE", share):
+                eora.aggregate(
+                    [("USA", "Industry", "S1"), ("CHN", "Industry", "S1")],
+                    ("USA", "Industry", "S1"),
+                )
+
+            self.assertEqual(eora.solver.depth, depth)
+            l = np.linalg.inv(np.eye(eora.a.shape[0]) - eora.a.values)
+            np.testing.assert_allclose(eora.solve(eora.y.values), l @ eora.y.values)
+
+    def test_aggregate_many(self):
+        eora = eo.test_eora()
+        expected = deepcopy(eora)
+        expected.aggregate(
+            [("USA", "Industry", "S1"), ("CHN", "Industry", "S1")], ("A", "Industry", "S1")
+        )
+        expected.aggregate(
+            [("USA", "Industry", "S2"), ("DEU", "Industry", "S3")], ("B", "Industry", "S2")
+        )
+
+        eora.aggregate_many(
+            {
+                ("USA", "Industry", "S1"): ("A", "Industry", "S1"),
+                ("CHN", "Industry", "S1"): ("A", "Industry", "S1"),
+                ("USA", "Industry", "S2"): ("B", "Industry", "S2"),
+                ("DEU", "Industry", "S3"): ("B", "Industry", "S2"),
+            }
+        )
+        pd.testing.assert_frame_equal(eora.t, expected.t, check_dtype=False)
+        pd.testing.assert_frame_equal(eora.y, expected.y, check_dtype=False)
+        pd.testing.assert_frame_equal(eora.q.f, expected.q.f, check_dtype=False)
+        np.testing.assert_allclose(eora.l.values, expected.l.values)
 
-        eora.dissaggregate(("test", "test", "test"), dis)
-        self.assertTrue("FOO".isupper())
+        eora.aggregate_regions({"USA": "NA", "CHN": "AS", "A": "AS", "B": "NA"})
+        self.assertEqual(eora.t.shape, (7, 7))
+        np.testing.assert_allclose(eora.t.values.sum(), expected.t.values.sum())
 
 
 if __name__ == "__main_":
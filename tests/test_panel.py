@@ -0,0 +1,58 @@
+from src import panel
+from functools import partial
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+import pymrio
+import unittest
+from unittest import mock
+
+
+REGIONS = {f"reg{i}": "A" if i <= 2 else "B" for i in range(1, 7)}
+
+
+def mining_flows(year: int, data_path: str) -> pd.DataFrame:
+    # the path is passed explicitly, spawned workers do not see the patched DATA_PATH
+    return panel.sector_flows(year, "mining", REGIONS, path=data_path.format(year=year))
+
+
+class TestPanel(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        for year in [2010, 2011]:
+            os.makedirs(os.path.join(self.tmp.name, str(year)))
+            with open(os.path.join(self.tmp.name, str(year), "Eora26.zip"), "w") as f:
+                f.write(str(year))
+        self.data_path = os.path.join(self.tmp.name, "{year}")
+        data_path = mock.patch.object(panel, "DATA_PATH", self.data_path)
+        data_path.start()
+        self.addCleanup(data_path.stop)
+        self.addCleanup(self.tmp.cleanup)
+
+    @mock.patch.object(pymrio, "parse_eora26", side_effect=lambda **_: pymrio.load_test())
+    def test_map_years(self, parse):
+        for year in [2010, 2011]:
+            panel.cache_year(year)
+        panel.cache_year(2010)
+        self.assertEqual(parse.call_count, 2)
+
+        flows = panel.stack(
+            panel.map_years(
+                partial(mining_flows, data_path=self.data_path), [2010, 2011], processes=2
+            )
+        )
+        self.assertEqual(parse.call_count, 2)
+
+        z = pymrio.load_test().Z
+        expected = z.loc[(["reg1", "reg2"], "mining"), ["reg3", "reg4", "reg5", "reg6"]]
+        self.assertEqual(flows.loc[(2011, "A"), "B"], expected.values.sum())
+        self.assertEqual(list(flows.index.get_level_values("year").unique()), [2010, 2011])
+
+        totals = panel.stack({2010: np.ones(3), 2011: np.zeros(3)})
+        self.assertEqual(totals.shape, (2, 3))
+        pd.testing.assert_frame_equal(panel.load_year(2010)["z"], z)
+
+
+if __name__ == "__main__":
+    unittest.main()
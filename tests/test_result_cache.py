@@ -0,0 +1,107 @@
+from src.result_cache import ResultCache
+import importlib
+import os
+import sys
+import tempfile
+import pandas as pd
+import unittest
+from unittest import mock
+
+
+def demand(eora, from_codes, to_codes):
+    return eora.loc[list(to_codes), list(from_codes)].sum(axis=1)
+
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = self.tmp.name
+        self.write_data(1.0)
+        self.load = mock.Mock(side_effect=self.read_data)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write_data(self, value: float) -> None:
+        codes = ["USA", "CHN", "DEU"]
+        frame = pd.DataFrame(value, index=codes, columns=codes)
+        frame.to_csv(os.path.join(self.path, "data.csv"))
+
+    def read_data(self) -> pd.DataFrame:
+        return pd.read_csv(os.path.join(self.path, "data.csv"), index_col=0)
+
+    def test_memoizes_across_runs(self):
+        results = ResultCache(self.path, load=self.load)
+        first = results(demand, ["USA", "DEU"], ["CHN"])
+        self.assertEqual(self.load.call_count, 1)
+
+        # a new run, sets are keyed independent of their order
+        rerun = ResultCache(self.path, load=self.load)
+        pd.testing.assert_series_equal(rerun(demand, ["USA", "DEU"], ["CHN"]), first)
+        self.assertEqual(self.load.call_count, 1)
+        ResultCache(self.path, load=self.load)(demand, {"USA", "DEU"}, ["CHN"])
+        self.assertEqual(self.load.call_count, 2)
+        ResultCache(self.path, load=self.load)(demand, {"DEU", "USA"}, ["CHN"])
+        self.assertEqual(self.load.call_count, 2)
+
+        # the results follow the order of lists, so it is part of the key
+        ResultCache(self.path, load=self.load)(demand, ["DEU", "USA"], ["CHN"])
+        self.assertEqual(self.load.call_count, 3)
+
+        # swapping the groups is a different result
+        ResultCache(self.path, load=self.load)(demand, ["CHN"], ["USA", "DEU"])
+        self.assertEqual(self.load.call_count, 4)
+
+    def test_dataset_change_invalidates(self):
+        ResultCache(self.path, load=self.load)(demand, ["USA"], ["CHN"])
+        self.write_data(2.0)
+        file = os.path.join(self.path, "data.csv")
+        stat = os.stat(file)
+        os.utime(file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+        res = ResultCache(self.path, load=self.load)(demand, ["USA"], ["CHN"])
+        self.assertEqual(res.iloc[0], 2.0)
+
+    def test_loader_and_version_are_part_of_the_key(self):
+        ResultCache(self.path, load=self.load)(demand, ["USA"], ["CHN"])
+        ResultCache(self.path, load=self.load, version="2")(demand, ["USA"], ["CHN"])
+        self.assertEqual(self.load.call_count, 2)
+
+        lean = ResultCache(self.path, load=lambda: self.load())
+        lean(demand, ["USA"], ["CHN"])
+        full = ResultCache(self.path, load=lambda: self.load() * 1)
+        full(demand, ["USA"], ["CHN"])
+        self.assertEqual(self.load.call_count, 4)
+
+    def test_module_change_invalidates(self):
+        # editing a helper of the cached function invalidates its results
+        code = tempfile.TemporaryDirectory()
+        self.addCleanup(code.cleanup)
+        module_path = os.path.join(code.name, "cached_functions.py")
+        sys.path.insert(0, code.name)
+        self.addCleanup(sys.path.remove, code.name)
+        self.addCleanup(sys.modules.pop, "cached_functions", None)
+        results = []
+        for factor in [1, 2]:
+            with open(module_path, "w") as f:
+                f.write(
+                    "def helper(x):\n"
+                    f"    return x * {factor}\n\n\n"
+                    "def scaled(eora, codes):\n"
+                    "    return helper(eora.loc[codes, codes].sum().sum())\n"
+                )
+            sys.modules.pop("cached_functions", None)
+            importlib.invalidate_caches()
+            module = importlib.import_module("cached_functions")
+            results.append(ResultCache(self.path, load=self.load)(module.scaled, ["USA"]))
+        self.assertEqual(results, [1.0, 2.0])
+
+    def test_eviction(self):
+        results = ResultCache(self.path, load=self.load, max_bytes=0)
+        results(demand, ["USA"], ["CHN"])
+        self.assertEqual(
+            [name for name in os.listdir(results.directory) if name.endswith(".pkl")], []
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,222 @@
+from src import share_functions as sf
+import src.eora as eo
+from src import eora_cache
+from tests.test_eora import write_toy_eora
+from src.sparse_frame import SparseFrame
+from types import SimpleNamespace
+import tempfile
+import numpy as np
+import pandas as pd
+import pymrio
+import unittest
+from unittest import mock
+
+CO2 = "I-GHG-CO2 emissions"
+VA = ("Primary input", "Compensation of employees D.1")
+
+
+def toy_tables() -> tuple[eo.Eora, SimpleNamespace]:
+    """A toy Eora and the same tables in pymrio's layout, with a materialized L"""
+    with tempfile.TemporaryDirectory() as path:
+        write_toy_eora(path)
+        eora = eo.Eora(path, cache=False)
+
+    va = eora.v.droplevel(0)
+    io = SimpleNamespace(
+        Y=eora.y,
+        L=pd.DataFrame(eora.solver.inverse(), index=eora.sectors, columns=eora.sectors),
+        A=eora.a,
+        Z=eora.t,
+        Q=SimpleNamespace(S=eora.q.a, F=eora.q.f),
+        VA=SimpleNamespace(S=va.div(eora.x, axis=1), F=va),
+    )
+    return eora, io
+
+
+# the per target formulas the batched functions replace, with blocks of L
+
+
+def reference_embodied(io, from_codes, to_codes, s: pd.DataFrame) -> pd.DataFrame:
+    induced = io.L.loc[to_codes, to_codes].dot(
+        io.Y.loc[to_codes, from_codes].sum(axis=1)
+    ) + io.L.loc[to_codes, from_codes].dot(io.Y.loc[from_codes, from_codes].sum(axis=1))
+    return s.loc[:, to_codes].mul(induced)
+
+
+def reference_ptt(io, from_codes, to_codes) -> float:
+    def ratio(a, b):
+        co2 = reference_embodied(io, a, b, io.Q.S.loc[[CO2]]).sum().sum()
+        return co2 / reference_embodied(io, a, b, io.VA.S.loc[[VA]]).sum().sum()
+
+    return ratio(from_codes, to_codes) / ratio(to_codes, from_codes)
+
+
+def reference_co2_total(io, from_codes, to_codes) -> pd.Series:
+    f_shares = io.Q.S.loc[CO2]
+    emissions = {}
+    for code in from_codes:
+        y_total = io.Y.loc[:, code].sum(axis=1)
+        total = f_shares.mul(io.L.dot(y_total)).sum().sum()
+        south = f_shares[to_codes].mul(io.L.loc[to_codes, :].dot(y_total)).sum().sum()
+        emissions[(code, "Final Demand")] = south / total
+    res = pd.Series(emissions)
+    res.index.names = ["Region", "Sector"]
+    return res
+
+
+class TestShareFunctions(unittest.TestCase):
+    def test_calc_lean(self):
+        full = pymrio.load_test().calc_all()
+        lean = sf.calc_lean(pymrio.load_test(), {"emissions": ["emission_type1"]})
+
+        pd.testing.assert_frame_equal(lean.L, full.L)
+        pd.testing.assert_frame_equal(
+            lean.emissions.S, full.emissions.S.loc[["emission_type1"]]
+        )
+        self.assertEqual(len(lean.emissions.F_Y), 1)
+        self.assertIsNone(lean.emissions.D_cba)
+        np.testing.assert_allclose(lean.x.values, full.x.values)
+
+    def test_embodied_flows(self):
+        _, io = toy_tables()
+        targets = {"CHN": ["CHN"], "south": ["CHN", "DEU"], "overlap": ["USA", "DEU"]}
+        for from_codes in [["USA"], "USA", ["USA", "CHN"]]:
+            flows = sf.embodied_flows(io, from_codes, targets)
+            for name, to_codes in targets.items():
+                co2 = reference_embodied(io, from_codes, to_codes, io.Q.S.loc[[CO2]])
+                va = reference_embodied(io, from_codes, to_codes, io.VA.S.loc[[VA]])
+                expected = {
+                    "co2": co2.sum().sum(),
+                    "value_added": va.sum().sum(),
+                    "co2_share": co2.sum().sum() / io.Q.F.loc[CO2, to_codes].sum().sum(),
+                    "dependency_share": va.sum().sum() / io.VA.F.loc[VA, to_codes].sum(),
+                    "ptt": reference_ptt(io, from_codes, to_codes),
+                }
+                for column, value in expected.items():
+                    self.assertAlmostEqual(flows.loc[name, column], value, msg=(name, column))
+
+    def test_ptt_matrix(self):
+        _, io = toy_tables()
+        groups = {"north": ["USA"], "west": ["USA", "DEU"]}
+        matrix = sf.ptt_matrix(io, groups, ["CHN", "DEU"])
+        self.assertEqual(list(matrix.index), ["north", "west"])
+        self.assertEqual(list(matrix.columns), ["CHN", "DEU"])
+        for name, from_codes in groups.items():
+            for target in ["CHN", "DEU"]:
+                self.assertAlmostEqual(
+                    matrix.loc[name, target], reference_ptt(io, from_codes, [target])
+                )
+                self.assertAlmostEqual(
+                    sf.ptt(io, from_codes, target), reference_ptt(io, from_codes, [target])
+                )
+
+        single = sf.ptt_matrix(io, ["USA"], {"south": ["CHN", "DEU"]})
+        self.assertAlmostEqual(
+            single.loc["from", "south"], reference_ptt(io, ["USA"], ["CHN", "DEU"])
+        )
+
+    def test_co2_total(self):
+        _, io = toy_tables()
+        from_codes = ["USA", "DEU", "CHN"]
+        pd.testing.assert_series_equal(
+            sf.co2_total(io, from_codes, ["CHN", "DEU"]),
+            reference_co2_total(io, from_codes, ["CHN", "DEU"]),
+        )
+
+    def test_exclusions(self):
+        _, io = toy_tables()
+        from_codes, to_codes = ["USA"], ["CHN", "DEU"]
+        exclusions = {"all": [], "without CHN": ["CHN"], "without USA": ["USA"]}
+
+        totals = sf.co2_total(io, ["USA", "DEU"], to_codes, exclusions)
+        shares = sf.co2_share_variants(io, from_codes, to_codes, exclusions)
+        for name, excluded in exclusions.items():
+            reduced = [code for code in to_codes if code not in excluded]
+            np.testing.assert_allclose(
+                totals[name].values, reference_co2_total(io, ["USA", "DEU"], reduced).values
+            )
+            # co2_shares is compartments × sectors, the variants are summed over compartments
+            plain = sf.co2_shares(io, from_codes, reduced).sum(axis=0)
+            pd.testing.assert_series_equal(
+                shares[name].dropna(), plain, check_names=False
+            )
+        self.assertTrue(shares["without CHN"].loc["CHN"].isna().all())
+
+    def test_eora_and_pymrio_layout(self):
+        eora, io = toy_tables()
+        from_codes, to_codes = ["USA"], ["CHN", "DEU"]
+
+        for func in [
+            sf.embodied_co2_emissions,
+            sf.embodied_value_added,
+            sf.dependency_shares,
+            sf.co2_shares,
+            sf.co2_shares_sectoral,
+            sf.co2_total,
+            sf.sub_system_output,
+        ]:
+            self.assert_same(func(eora, from_codes, to_codes), func(io, from_codes, to_codes))
+        self.assert_same(
+            sf.ptt_matrix(eora, from_codes, to_codes), sf.ptt_matrix(io, from_codes, to_codes)
+        )
+        self.assert_same(
+            sf.dependency_shares(eora, from_codes, to_codes, leontief="sub"),
+            sf.dependency_shares(io, from_codes, to_codes, leontief="sub"),
+        )
+        # the Eora answers everything from its factorization
+        self.assertIsNone(eora._l)
+
+    def test_mmap_eora_caches_l(self):
+        eora, _ = toy_tables()
+        with tempfile.TemporaryDirectory() as path:
+            write_toy_eora(path)
+            mapped = eo.Eora(path, mmap=True)
+            self.assertNotIn("l", eora_cache.cached_frames(path))
+
+            from_codes, to_codes = ["USA"], ["CHN", "DEU"]
+            self.assert_same(
+                sf.embodied_co2_emissions(mapped, from_codes, to_codes),
+                sf.embodied_co2_emissions(eora, from_codes, to_codes),
+            )
+            self.assertIn("l", eora_cache.cached_frames(path))
+
+            # later loads (e.g. workers) share the cached L instead of each factorizing the table
+            remapped = eo.Eora(path, mmap=True)
+            sf.embodied_co2_emissions(remapped, from_codes, to_codes)
+            self.assertIsNone(remapped._solver)
+
+    def test_sparse_sub_system(self):
+        eora, _ = toy_tables()
+        with tempfile.TemporaryDirectory() as path:
+            write_toy_eora(path)
+            sparse = eo.Eora(path, cache=False, sparse=True)
+
+        to_dense = SparseFrame.to_dense
+        densified = []
+
+        def record(frame):
+            densified.append(frame.shape)
+            return to_dense(frame)
+
+        from_codes, to_codes = ["USA"], ["CHN", "DEU"]
+        with mock.patch.object(SparseFrame, "to_dense", record):
+            self.assert_same(
+                sf.sub_system_output(sparse, from_codes, to_codes),
+                sf.sub_system_output(eora, from_codes, to_codes),
+            )
+            self.assert_same(
+                sf.dependency_shares(sparse, from_codes, to_codes, leontief="sub"),
+                sf.dependency_shares(eora, from_codes, to_codes, leontief="sub"),
+            )
+        # only the to × from block of T is densified
+        self.assertEqual(set(densified), {(6, 3)})
+
+    def assert_same(self, left, right):
+        if isinstance(left, pd.DataFrame):
+            pd.testing.assert_frame_equal(left, right)
+        else:
+            pd.testing.assert_series_equal(left, right)
+
+
+if __name__ == "__main__":
+    unittest.main()